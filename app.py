@@ -1,43 +1,66 @@
+import os
+import threading
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from aggregation import CUBE_ENABLED, AggregationCube, top_n as select_top_n, with_other
+from backends import DuckDBBackend, PandasBackend, available_backends
+from csv_engine import file_fingerprint, open_csv_batches, read_csv_head, read_csv_strings
+from dataset import DATASET_STORE_MAX_ENTRIES, HASH_FUNCS, DatasetHandle, LazyDatasetHandle, downcast_report, upload_key
+from dutch_numbers import to_numeric_nl
+from ingest import aggregate_out_of_core, spill_in_use, spill_to_disk, unique_values_in_chunks
+from parallel import map_columns
+from upload_cache import format_entries, upload_cache
+
+# Bestanden groter dan deze drempel worden standaard in streaming (out-of-core) modus verwerkt
+STREAMING_THRESHOLD_MB = int(os.environ.get("DUO_STREAMING_THRESHOLD_MB", "100"))
+# Aantal rijen dat in streaming modus wordt ingelezen voor kolomdetectie en voorbeeldweergave
+STREAMING_SAMPLE_ROWS = 1000
+# Bestanden met minstens zoveel kolommen worden kolom voor kolom ingelezen wanneer een weergave ze nodig heeft
+LAZY_MIN_COLUMNS = int(os.environ.get("DUO_LAZY_MIN_COLUMNS", "20"))
+
+# Hulpfunctie om één kolom te classificeren op basis van inhoud
+def classify_column(series, threshold=0.6, max_sample=200):
+    """
+    Geeft 'numeric' als >threshold van tot max_sample niet-lege waarden numeriek is,
+    'possible' bij minstens 30% en anders None.
+    """
+    # Snelle check als het type al numeriek is
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+
+    try:
+        # Gebruik tot max_sample niet-lege waardes
+        sample = series.dropna().astype(str).head(max_sample)
+        if len(sample) == 0:
+            return None
+
+        numeric_ratio = to_numeric_nl(sample).notna().mean()
+
+        # Een kolom is numeriek als threshold van de sample geconverteerd kon worden
+        if numeric_ratio >= threshold:
+            return 'numeric'
+        elif numeric_ratio >= 0.3:
+            return 'possible'
+    except Exception:
+        pass
+    return None
+
 # Hulpfunctie om numerieke kolommen te identificeren op basis van inhoud
-@st.cache_data
-def get_numeric_cols(df, threshold=0.6, max_sample=200):
+@st.cache_data(hash_funcs=HASH_FUNCS)
+def get_numeric_cols(dataset, threshold=0.6, max_sample=200, workers=None):
     """
-    Identificeert numerieke kolommen door tot max_sample niet-lege rijen te controleren.
-    Een kolom wordt als numeriek beschouwd als >threshold van de waarden numeriek is.
-    
-    Gebruikt Nederlandse/Europese notatie: verwijdert . (duizendtal), vervangt , door . (decimaal).
-    Threshold en samplegrootte zijn instelbaar.
+    Markeert een kolom als numeriek als meer dan threshold van max_sample niet-lege
+    waarden een getal is; de kolommen worden parallel geclassificeerd (zie parallel.py).
     """
-    numeric_cols = []
-    possible_numeric_cols = []
-    for col in df.columns:
-        # Snelle check als het type al numeriek is
-        if pd.api.types.is_numeric_dtype(df[col]):
-            numeric_cols.append(col)
-            continue
+    df = dataset.sample
+    kinds = map_columns(lambda col: classify_column(df[col], threshold, max_sample), df.columns, workers)
+    numeric_cols = [col for col, kind in zip(df.columns, kinds) if kind == 'numeric']
+    possible_numeric_cols = [col for col, kind in zip(df.columns, kinds) if kind == 'possible']
 
-        try:
-            # Gebruik tot max_sample niet-lege waardes
-            sample = df[col].dropna().astype(str).head(max_sample)
-            if len(sample) == 0:
-                continue
-
-            # Opschonen voor Nederlandse notatie: verwijder . (duizendtal), vervang , (decimaal) door .
-            cleaned_sample = sample.str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.strip()
-            numeric_ratio = pd.to_numeric(cleaned_sample, errors='coerce').notna().mean()
-
-            # Een kolom is numeriek als threshold van de sample geconverteerd kon worden
-            if numeric_ratio >= threshold:
-                numeric_cols.append(col)
-            elif numeric_ratio >= 0.3:
-                possible_numeric_cols.append(col)
-        except Exception:
-            continue
     # Debug-output om te helpen bij het vinden van mogelijke missende kolommen
     st.sidebar.write("Detectie numerieke kolommen:", numeric_cols)
     if possible_numeric_cols:
@@ -45,32 +68,106 @@ def get_numeric_cols(df, threshold=0.6, max_sample=200):
     return numeric_cols
 
 # Hulpfunctie om de 'jaar'-kolom te vinden
-@st.cache_data
-def get_year_col(df):
+@st.cache_data(hash_funcs=HASH_FUNCS)
+def get_year_col(dataset):
     """Zoekt naar een kolom die waarschijnlijk een jaartal vertegenwoordigt."""
-    for col in df.columns:
+    for col in dataset.columns:
         col_lower = col.lower()
         if 'jaar' in col_lower or 'onderwijsjaar' in col_lower or col_lower == 'jj':
             return col
     return None
 
 # Hulpfunctie om de CSV te laden
-@st.cache_data
+# cache_resource i.p.v. cache_data: de dataset wordt gedeeld en niet bij elke toegang ge-unpickled
+@st.cache_resource(hash_funcs=HASH_FUNCS, max_entries=DATASET_STORE_MAX_ENTRIES)
 def load_data(uploaded_file):
     """
-    Laadt de CSV met een puntkomma als scheidingsteken.
-    Gebruikt 'latin-1' codering om UnicodeDecodeError te voorkomen bij speciale karakters.
+    Laadt de CSV (';', latin-1) via de Parquet-cache als DatasetHandle; brede bestanden
+    worden lui ingelezen, kolom voor kolom wanneer een weergave ze nodig heeft.
     """
     try:
-        # We lezen de data in met 'object' dtype om te voorkomen dat pandas 
+        cache_key = file_fingerprint(uploaded_file)
+        sample = upload_cache.read_head(cache_key, "app", "data", STREAMING_SAMPLE_ROWS)
+        in_cache = sample is not None
+        if sample is None:
+            sample = read_csv_head(uploaded_file, STREAMING_SAMPLE_ROWS, sep=';', encoding='latin-1')
+        if sample.shape[1] >= LAZY_MIN_COLUMNS:
+            if not in_cache:
+                cache_upload_in_background(uploaded_file, cache_key)
+            return LazyDatasetHandle(sample, cache_key, lambda cols: load_columns(uploaded_file, cache_key, cols))
+
+        # Zelfde bestand al eerder ingelezen? Dan direct uit de schijfcache laden
+        cached = upload_cache.get(cache_key, "app") if in_cache else None
+        if cached is not None:
+            return DatasetHandle(cached.frames["data"], cache_key)
+
+        # We lezen de data in als tekst om te voorkomen dat pandas 
         # getallen met een '.' (bijv. 1.000) als floats interpreteert.
         # Belangrijk: gebruik encoding='latin-1' voor de DUO-bestanden
-        df = pd.read_csv(uploaded_file, delimiter=';', dtype=str, encoding='latin-1')
-        return df
+        df = read_csv_strings(uploaded_file, sep=';', encoding='latin-1')
+        upload_cache.put(cache_key, "app", {"data": df})
+        return DatasetHandle(df, cache_key)
+    except Exception as e:
+        st.error(f"Fout bij het lezen van het bestand: {e}")
+        return None
+
+def load_columns(uploaded_file, cache_key, columns):
+    """Leest alleen de gegeven kolommen: uit de Parquet-cache als die er is, anders uit de CSV."""
+    frame = upload_cache.read_columns(cache_key, "app", "data", columns)
+    if frame is None:
+        frame = read_csv_strings(uploaded_file, sep=';', encoding='latin-1', columns=columns)
+    return frame
+
+def cache_upload_in_background(uploaded_file, cache_key):
+    """Zet de CSV op de achtergrond blok voor blok om naar de Parquet-cache, zonder de eerste weergave op te houden."""
+    if not upload_cache.enabled:
+        return
+    threading.Thread(
+        target=upload_cache.put_batches,
+        args=(cache_key, "app", "data", lambda: open_csv_batches(uploaded_file, sep=';', encoding='latin-1')),
+        name="upload-cache",
+        daemon=True,
+    ).start()
+
+# Hulpfuncties voor de streaming modus (grote bestanden)
+@st.cache_resource(hash_funcs=HASH_FUNCS, max_entries=DATASET_STORE_MAX_ENTRIES)
+def load_sample(uploaded_file, nrows=STREAMING_SAMPLE_ROWS):
+    """Laadt alleen de eerste nrows rijen, voor kolomdetectie en de voorbeeldweergave."""
+    try:
+        uploaded_file.seek(0)
+        df = pd.read_csv(uploaded_file, delimiter=';', dtype=str, encoding='latin-1', nrows=nrows)
+        return DatasetHandle(df, f"{upload_key(uploaded_file)}-sample{nrows}")
     except Exception as e:
         st.error(f"Fout bij het lezen van het bestand: {e}")
         return None
 
+def spill_upload(uploaded_file):
+    """Schrijft de upload naar de lokale schijf (één keer per upload), zodat werkprocessen het bestand kunnen lezen."""
+    return spill_to_disk(uploaded_file, upload_key(uploaded_file))
+
+@st.cache_data(hash_funcs=HASH_FUNCS)
+def load_year_values_streaming(uploaded_file, year_col):
+    """Haalt de unieke jaartallen op door alleen de jaarkolom blok voor blok te lezen."""
+    return unique_values_in_chunks(spill_upload(uploaded_file), year_col)
+
+@st.cache_data(hash_funcs=HASH_FUNCS)
+def load_aggregated_streaming(uploaded_file, y_axis, x_axes, year_col=None, selected_years=()):
+    """
+    Aggregeert het bestand out-of-core (zie ingest.aggregate_out_of_core): werkprocessen
+    verwerken elk een blok van het weggeschreven bestand en de deelsommen worden samengevoegd.
+    Het piekgeheugen hangt af van de blokgrootte en het aantal groepen, niet van de bestandsgrootte.
+    """
+    return aggregate_out_of_core(spill_upload(uploaded_file), y_axis, list(x_axes), year_col, list(selected_years))
+
+@st.cache_data
+def load_top_groups_duckdb(source_path, y_axis, x_axes, n, year_col=None, selected_years=()):
+    """
+    Jaarfilter, numerieke conversie, aggregatie en Top N in één DuckDB-query over de
+    gecachete Parquet of de CSV op schijf (zie backends.DuckDBBackend).
+    """
+    with spill_in_use(source_path):
+        return DuckDBBackend(source_path).top_groups(y_axis, list(x_axes), n, year_col, list(selected_years))
+
 # --- PAGINA CONFIGURATIE ---
 st.set_page_config(layout="wide", page_title="MBO Dashboard")
 
@@ -85,18 +182,54 @@ if uploaded_file is None:
     st.stop()
 
 # --- DATA LADEN ---
-df = load_data(uploaded_file)
-if df is None:
+# Streaming modus: schrijf het bestand naar schijf en aggregeer per blok in werkprocessen (voor grote bestanden)
+streaming_mode = st.toggle(
+    "Streaming modus (grote bestanden)",
+    value=uploaded_file.size > STREAMING_THRESHOLD_MB * 1024 * 1024,
+    help=(
+        "Schrijft het bestand naar schijf en aggregeert het in blokken in parallelle werkprocessen, "
+        "zodat niet het hele bestand in het geheugen hoeft. Standaard aan boven "
+        f"{STREAMING_THRESHOLD_MB} MB."
+    )
+)
+
+if streaming_mode:
+    # Alleen een steekproef laden voor kolomdetectie; de aggregatie loopt later over het hele bestand
+    dataset = load_sample(uploaded_file)
+else:
+    dataset = load_data(uploaded_file)
+if dataset is None:
     st.stop()
 
 # --- KOLOM IDENTIFICATIE ---
-all_cols = df.columns.tolist()
-numeric_cols = get_numeric_cols(df)
-year_col = get_year_col(df)
+all_cols = dataset.columns
+numeric_cols = get_numeric_cols(dataset)
+year_col = get_year_col(dataset)
 
 # Groeperingskolommen zijn alle kolommen die niet als numeriek zijn geïdentificeerd
 grouping_cols = [col for col in all_cols if col not in numeric_cols]
 
+# Groeperingskolommen één keer per dataset als categoricals (woordenboekcodering) opslaan:
+# minder geheugen, en groepscodes en filters hoeven de tekst niet meer te hashen
+dataset.categorize(grouping_cols)
+df = dataset.sample
+
+# Jaarkolom één keer per dataset indelen in partities (rijposities per jaar) voor de slicer
+if year_col and not streaming_mode:
+    dataset.partitions(year_col)
+
+# Optioneel: sommen per (groepering x jaar x meetwaarde) eenmalig per dataset op de
+# achtergrond vooraf berekenen; de grafiek gebruikt die zodra ze klaar zijn.
+# Niet voor brede bestanden die kolom voor kolom worden ingelezen: de kubus heeft alle kolommen nodig
+cube = None
+if CUBE_ENABLED and not streaming_mode and not dataset.lazy:
+    cube = dataset.derived(
+        ("cube", year_col),
+        lambda: AggregationCube(dataset, grouping_cols, numeric_cols, year_col)
+    )
+    if cube.error is not None:
+        st.sidebar.caption(f"Voorberekening mislukt ({cube.error}); grafieken worden uit de ruwe rijen berekend.")
+
 # --- ZIJBALK VOOR CONTROLES ---
 st.sidebar.header("Dashboard Instellingen")
 
@@ -149,9 +282,21 @@ if manual_numeric:
     # Waarschuw dat een override actief is
     st.sidebar.warning(f"Handmatige override: {', '.join(manual_numeric)} toegevoegd aan numerieke kolommen.")
 
+# --- Upload-cache op schijf bekijken of legen ---
+with st.sidebar.expander("Upload-cache"):
+    st.caption(f"Eerder ingelezen bestanden in {upload_cache.directory}")
+    # De map alleen doorlopen als iemand de inhoud wil zien, niet bij elke rerun
+    if st.toggle("Toon inhoud", key="show_cache_entries"):
+        st.dataframe(format_entries(), hide_index=True)
+    if st.button("Cache legen"):
+        upload_cache.clear()
+        st.rerun()
+
 # --- Geavanceerde Instellingen ---
 selected_years = []
 show_data_labels = False
+show_other = False
+backend_name = available_backends()[0]
 
 if advanced_mode:
     st.sidebar.subheader("Geavanceerde Opties")
@@ -159,8 +304,15 @@ if advanced_mode:
     # Jaar Slicer
     if year_col:
         try:
+            # In streaming modus bevat df slechts een steekproef, dus lees de jaarkolom apart
+            if streaming_mode:
+                year_values = pd.Series(load_year_values_streaming(uploaded_file, year_col), dtype=str)
+            else:
+                # De opties komen uit de partitie-index, niet uit een scan van de hele kolom
+                year_values = pd.Series(list(dataset.partitions(year_col)), dtype=str)
+
             # Converteer jaarkolom naar numeriek voor sortering
-            years = pd.to_numeric(df[year_col], errors='coerce').dropna().unique()
+            years = pd.to_numeric(year_values, errors='coerce').dropna().unique()
             years.sort()
             years = [str(int(y)) for y in years][::-1] # Sorteer aflopend
             
@@ -177,6 +329,17 @@ if advanced_mode:
     # Data Labels Toggle
     show_data_labels = st.sidebar.checkbox("Toon waarden in grafiek", value=False)
 
+    # Alle groepen buiten de Top N samen als één balk
+    show_other = st.sidebar.checkbox("Toon overige groepen als 'Overig'", value=False)
+
+    # Rekenmotor voor de aggregatie (zie backends.py); DuckDB alleen als het geïnstalleerd is
+    backends = available_backends()
+    if len(backends) > 1:
+        backend_name = st.sidebar.selectbox(
+            "Rekenmotor:", backends,
+            help="pandas rekent in het geheugen; duckdb rekent met één SQL-query direct op het bestand."
+        )
+
     # Placeholders voor toekomstige functies
     st.sidebar.text_input("Formule Editor (Toekomst)", disabled=True)
     st.sidebar.selectbox("Decimale Toggle (Toekomst)", ["Aantallen", "Decimalen"], disabled=True)
@@ -187,37 +350,47 @@ if not y_axis or not x_axes:
     st.warning("Selecteer alstublieft een Y-as en minimaal één X-as in de zijbalk.")
     st.stop()
 
-# Kopieer de data om te verwerken
-df_processed = df.copy()
-
-# 1. Jaar Filter (indien geselecteerd)
-if advanced_mode and year_col and selected_years:
-    df_processed = df_processed[df_processed[year_col].isin(selected_years)]
+filter_year_col = year_col if (advanced_mode and selected_years) else None
 
-# 2. Converteer geselecteerde X-assen naar numeriek (met robuuste Nederlandse notatie correctie)
-for col in x_axes:
-    cleaned_series = df_processed[col].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-
-    df_processed[col] = pd.to_numeric(
-        cleaned_series, 
-        errors='coerce'
-    ).fillna(0)
-
-# 3. Aggregeer de data
+# 1-5. Jaarfilter, numerieke conversie, aggregatie en Top N (hoogste waarden).
+# De Top N is een gedeeltelijke selectie in plaats van een volledige sortering; de som
+# van de overige groepen komt in dezelfde stap mee (zie aggregation.top_n)
 try:
-    df_agg = df_processed.groupby(y_axis)[x_axes].sum().reset_index()
+    if backend_name == "duckdb":
+        # Direct op de gecachete Parquet als die er is, anders op de CSV op schijf
+        source = None if streaming_mode else upload_cache.frame_path(dataset.fingerprint, "app", "data")
+        top_result = load_top_groups_duckdb(
+            str(source or spill_upload(uploaded_file)),
+            y_axis,
+            tuple(x_axes),
+            top_n,
+            filter_year_col,
+            tuple(selected_years),
+        )
+    elif streaming_mode:
+        # Jaarfilter, numerieke conversie en aggregatie gebeuren per blok tijdens het inlezen
+        df_agg = load_aggregated_streaming(
+            uploaded_file,
+            y_axis,
+            tuple(x_axes),
+            filter_year_col,
+            tuple(selected_years),
+        )
+        df_agg['Totaal'] = df_agg[x_axes].sum(axis=1)
+        top_result = select_top_n(df_agg, 'Totaal', top_n, label_col=y_axis)
+    else:
+        # Uit de vooraf berekende kubus als die de weergave kan beantwoorden, anders via de
+        # gecachete groepscodes van de Y-as; elke kolom wordt per dataset maar één keer
+        # omgezet, dus een andere sortering of Top N parseert niets opnieuw
+        top_result = PandasBackend(dataset, cube).top_groups(y_axis, x_axes, top_n, filter_year_col, selected_years)
 except Exception as e:
     st.error(f"Fout bij het aggregeren van data. Controleer of {y_axis} correct is: {e}")
     st.stop()
 
-# 4. Bereken Totaal voor sortering
-df_agg['Totaal'] = df_agg[x_axes].sum(axis=1)
-
-# 5. Selecteer Top N (hoogste waarden)
-df_top_n = df_agg.sort_values('Totaal', ascending=False).head(top_n)
+df_top_n = with_other(top_result, y_axis) if show_other else top_result.top
 
 # 5b. Sorteer de Top N subset voor de visuele weergave (Plotly)
-df_top_n = df_top_n.sort_values('Totaal', ascending=sort_ascending)
+df_top_n = df_top_n.sort_values('Totaal', ascending=sort_ascending, kind='stable')
 
 # 6. 'Melt' de data voor gestapelde grafiek in Plotly
 try:
@@ -276,3 +449,12 @@ with st.expander("Toon de Top N geaggregeerde data"):
 
 with st.expander("Toon de eerste 100 rijen van de ruwe data"):
     st.dataframe(df.head(100))
+
+# --- DEBUG: geheugen van de omgezette meetwaarden (zie dataset.downcast) ---
+with st.sidebar.expander("🔧 Debug: geheugen"):
+    memory = downcast_report(dataset.numeric_columns())
+    st.caption(f"Meetwaarden in kleinere types: {memory['MB (64-bit)'].sum() - memory['MB'].sum():.1f} MB "
+               f"bespaard van {memory['MB (64-bit)'].sum():.1f} MB")
+    st.dataframe(memory, hide_index=True)
+    if dataset.lazy:
+        st.caption(f"Ingelezen kolommen: {len(dataset.loaded_columns)} van {len(dataset.columns)}")
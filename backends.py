@@ -0,0 +1,171 @@
+"""
+Uitwisselbare rekenmotoren voor de Top N-aggregatie van app.py.
+
+Elke backend beantwoordt dezelfde vraag: de som per groep van de gekozen
+meetwaarden (Nederlandse notatie, '<5' en lege waarden tellen als 0), optioneel
+gefilterd op jaren, en daarvan de Top N plus de rest (zie aggregation.TopN).
+
+- pandas: de bestaande route via DatasetHandle (kubus of grouped_sum) en top_n;
+- duckdb: één SQL-query in een ingebedde DuckDB over de CSV of de gecachete
+          Parquet; jaarfilter, omzetting, groepssom en Top N in één keer.
+          Optioneel: alleen beschikbaar als duckdb is geïnstalleerd.
+
+De streaming modus van app.py heeft een eigen, gecachete route (zie ingest).
+
+Met DUO_AGGREGATION_BACKEND is de standaard in te stellen.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers.readers import STR_NA_VALUES
+
+from aggregation import TopN, grouped_sum, top_n
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - duckdb is optioneel
+    duckdb = None
+
+DEFAULT_BACKEND = os.environ.get("DUO_AGGREGATION_BACKEND", "pandas")
+
+# Naam van de kolom met de som van de gekozen meetwaarden
+TOTAL_COL = 'Totaal'
+
+
+def _with_total(frame, measure_cols):
+    frame[TOTAL_COL] = frame[list(measure_cols)].sum(axis=1)
+    return frame
+
+
+class AggregationBackend:
+    """Basisklasse: top_groups geeft een aggregation.TopN met de kolom Totaal."""
+
+    name = None
+
+    def top_groups(self, group_col, measure_cols, n, year_col=None, years=None):
+        raise NotImplementedError
+
+
+class PandasBackend(AggregationBackend):
+    """Aggregatie in het geheugen; gebruikt de kubus als die de weergave kan beantwoorden."""
+
+    name = "pandas"
+
+    def __init__(self, dataset, cube=None):
+        self.dataset = dataset
+        self.cube = cube
+
+    def top_groups(self, group_col, measure_cols, n, year_col=None, years=None):
+        filter_years = bool(year_col and years)
+        frame = None
+        if self.cube is not None:
+            frame = self.cube.answer(group_col, measure_cols, years if filter_years else None)
+        if frame is None:
+            # Elke kolom wordt per dataset maar één keer omgezet (zie DatasetHandle.numeric_column)
+            measures = {col: self.dataset.numeric_column(col, fill_value=0) for col in measure_cols}
+            rows = self.dataset.rows_for(year_col, years) if filter_years else None
+            frame = grouped_sum(self.dataset, group_col, measures, rows)
+        return top_n(_with_total(frame, measure_cols), TOTAL_COL, n, label_col=group_col)
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _dutch_number(column, decimal=','):
+    """SQL-expressie voor een tekstkolom in Nederlandse notatie; ongeldig of leeg wordt 0."""
+    text = f"trim(CAST({_quote(column)} AS VARCHAR))"
+    thousands = '.' if decimal == ',' else ','
+    text = f"replace({text}, '{thousands}', '')"
+    if decimal != '.':
+        text = f"replace({text}, '{decimal}', '.')"
+    return f"coalesce(try_cast({text} AS DOUBLE), 0)"
+
+
+class DuckDBBackend(AggregationBackend):
+    """
+    Ingebedde DuckDB over een Parquet-bestand (uit de upload-cache) of de CSV zelf.
+    Er draait geen aparte server; elke aanroep gebruikt een eigen in-memory verbinding.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path, sep=';', encoding='latin-1'):
+        if duckdb is None:
+            raise ImportError("De DuckDB-backend vereist het pakket 'duckdb'")
+        self.path = str(path)
+        self.sep = sep
+        self.encoding = encoding
+
+    def _source(self):
+        if self.path.endswith(".parquet"):
+            return "read_parquet(?)", [self.path]
+        null_values = ", ".join("'" + value.replace("'", "''") + "'" for value in sorted(STR_NA_VALUES))
+        return (
+            f"read_csv(?, delim = ?, header = true, all_varchar = true, encoding = ?, "
+            f"nullstr = [{null_values}])",
+            [self.path, self.sep, self.encoding],
+        )
+
+    def query(self, group_col, measure_cols, n, year_col=None, years=None):
+        """De SQL-query en parameters voor top_groups (los op te vragen voor debuggen)."""
+        source, params = self._source()
+        group = _quote(group_col)
+        measures = [_quote(col) for col in measure_cols]
+        converted = ", ".join(f"{_dutch_number(col)} AS {quoted}" for col, quoted in zip(measure_cols, measures))
+        total = " + ".join(measures)
+
+        where = f"{group} IS NOT NULL"
+        if year_col and years:
+            where += f" AND {_quote(year_col)} IN (SELECT unnest(?))"
+            params.append([str(year) for year in years])
+
+        # Alle groepen buiten de Top N vallen in één bucket (n + 1): de 'Overig'-rij
+        sums = ", ".join(f"sum({quoted}) AS {quoted}" for quoted in measures)
+        sql = f"""
+            WITH src AS (
+                SELECT {group} AS {group}, {converted} FROM {source} WHERE {where}
+            ),
+            grouped AS (
+                SELECT {group}, {sums} FROM src GROUP BY {group}
+            ),
+            ranked AS (
+                SELECT *, {total} AS {TOTAL_COL},
+                       row_number() OVER (ORDER BY {total} DESC, {group}) AS __rang__
+                FROM grouped
+            )
+            SELECT least(__rang__, ? + 1) AS __bucket__,
+                   CASE WHEN min(__rang__) <= ? THEN any_value({group}) END AS {group},
+                   {sums}, sum({TOTAL_COL}) AS {TOTAL_COL}, count(*) AS __aantal__
+            FROM ranked
+            GROUP BY __bucket__
+            ORDER BY __bucket__
+        """
+        limit = n if n is not None else np.iinfo(np.int64).max - 1
+        return sql, params + [limit, limit]
+
+    def top_groups(self, group_col, measure_cols, n, year_col=None, years=None):
+        sql, params = self.query(group_col, measure_cols, n, year_col, years)
+        with duckdb.connect() as connection:
+            result = connection.execute(sql, params).df()
+
+        limit = n if n is not None else len(result)
+        is_rest = result['__bucket__'] > limit
+        columns = [group_col, *measure_cols, TOTAL_COL]
+        top = result.loc[~is_rest, columns].reset_index(drop=True)
+        if is_rest.any():
+            rest_row = result.loc[is_rest].iloc[0]
+            rest, rest_count = rest_row[[*measure_cols, TOTAL_COL]], int(rest_row['__aantal__'])
+        else:
+            rest, rest_count = pd.Series(0, index=[*measure_cols, TOTAL_COL], dtype=object), 0
+        return TopN(top, rest, rest_count)
+
+
+def available_backends():
+    """Namen van de backends die in deze omgeving te gebruiken zijn, de standaard eerst."""
+    names = ["pandas"] + (["duckdb"] if duckdb is not None else [])
+    if DEFAULT_BACKEND in names:
+        names.remove(DEFAULT_BACKEND)
+        names.insert(0, DEFAULT_BACKEND)
+    return names
@@ -0,0 +1,70 @@
+"""
+Vergelijkt de aggregatie-backends uit backends.py voor een Top N-weergave.
+
+De pandas-backend wordt gemeten vanaf een ingelezen DatasetHandle, de eerste keer
+inclusief omzetten en factoriseren en daarna warm; DuckDB draait direct op de CSV
+en op een Parquet-kopie.
+
+Gebruik:
+    python benchmarks/bench_backends.py [pad/naar/duo.csv ...]
+
+Zonder argumenten wordt een synthetisch DUO-bestand gegenereerd.
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from backends import DuckDBBackend, PandasBackend, duckdb  # noqa: E402
+from csv_engine import read_csv_strings  # noqa: E402
+from dataset import DatasetHandle  # noqa: E402
+from sample_data import write_duo_csv  # noqa: E402
+
+GROUP_COL = "INSTELLINGSNAAM"
+MEASURES = ["AANTAL", "MAN"]
+YEARS = ["2022", "2023"]
+TOP_N = 10
+
+
+def _timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"  {label:28s} {time.perf_counter() - start:.3f}s")
+    return result
+
+
+def bench_file(path):
+    print(f"\n{path} ({Path(path).stat().st_size / 1e6:.1f} MB)")
+    frame = _timed("inlezen (pyarrow)", lambda: read_csv_strings(path))
+    dataset = DatasetHandle(frame, "bench")
+    backend = PandasBackend(dataset)
+    query = (GROUP_COL, MEASURES, TOP_N, "JAAR", YEARS)
+    expected = _timed("pandas (koud)", lambda: backend.top_groups(*query))
+    _timed("pandas (warm)", lambda: backend.top_groups(*query))
+
+    if duckdb is None:
+        print("  duckdb niet geïnstalleerd, overgeslagen")
+        return
+
+    parquet = Path(tempfile.mkdtemp()) / "data.parquet"
+    frame.to_parquet(parquet, index=False)
+    for label, source in (("duckdb (csv)", path), ("duckdb (parquet)", parquet)):
+        result = _timed(label, lambda: DuckDBBackend(source).top_groups(*query))
+        pd.testing.assert_frame_equal(result.top, expected.top.reset_index(drop=True), check_dtype=False)
+    print("  resultaten identiek")
+
+
+def main(paths):
+    if not paths:
+        tmp = Path(tempfile.mkdtemp()) / "duo_sample.csv"
+        paths = [write_duo_csv(tmp)]
+    for path in paths:
+        bench_file(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
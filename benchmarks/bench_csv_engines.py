@@ -0,0 +1,65 @@
+"""
+Vergelijkt de CSV-parsers uit csv_engine op dezelfde bestanden.
+
+Gebruik:
+    python benchmarks/bench_csv_engines.py [pad/naar/duo.csv ...]
+
+Zonder argumenten wordt een synthetisch DUO-bestand gegenereerd. De kolomnamen
+worden altijd ook gecontroleerd op een kopregel met dubbele en lege namen.
+"""
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from csv_engine import CSV_ENGINES, read_csv_strings  # noqa: E402
+from sample_data import write_duo_csv  # noqa: E402
+
+REPEATS = 3
+
+# Dubbele en lege kolomnamen (ook door een afsluitend scheidingsteken): de C-parser
+# maakt daar AANTAL.1 en Unnamed: N van
+ODD_HEADER_CSV = b"JAAR;NAAM;AANTAL;AANTAL;;AANTAL.1;\n2022;x;1;2;3;4;\n2023;y;<5;;;6;\n"
+
+
+def check_odd_header():
+    frames = {engine: read_csv_strings(io.BytesIO(ODD_HEADER_CSV), engine=engine) for engine in CSV_ENGINES}
+    pd.testing.assert_frame_equal(frames["pyarrow"].astype(object), frames["c"].astype(object))
+    print(f"\nDubbele/lege kolomnamen identiek: {frames['c'].columns.tolist()}")
+
+
+def bench_file(path):
+    print(f"\n{path} ({Path(path).stat().st_size / 1e6:.1f} MB)")
+    frames = {}
+    for engine in CSV_ENGINES:
+        timings = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            df = read_csv_strings(path, sep=';', encoding='latin-1', engine=engine)
+            timings.append(time.perf_counter() - start)
+        frames[engine] = df
+        memory_mb = df.memory_usage(deep=True).sum() / 1e6
+        print(f"  {engine:8s} beste van {REPEATS}: {min(timings):.3f}s  geheugen: {memory_mb:.1f} MB  "
+              f"dtype: {df.dtypes.iloc[0]}")
+
+    # Beide parsers moeten exact dezelfde data opleveren
+    pd.testing.assert_frame_equal(frames["pyarrow"].astype(object), frames["c"].astype(object))
+    print("  resultaten identiek")
+
+
+def main(paths):
+    check_odd_header()
+    if not paths:
+        tmp = Path(tempfile.mkdtemp()) / "duo_sample.csv"
+        paths = [write_duo_csv(tmp)]
+    for path in paths:
+        bench_file(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: dutch_numbers.parse_numbers tegenover de oude pandas-keten
+(.str.replace('.', '') -> .str.replace(',', '.') -> pd.to_numeric).
+
+Gebruik:
+    python benchmarks/bench_dutch_numbers.py [aantal_rijen]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from dutch_numbers import parse_numbers  # noqa: E402
+
+REPEATS = 5
+
+
+def old_chain(series):
+    cleaned = series.astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def make_columns(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 250_000, rows)
+    dutch = pd.Series([f"{v:,}".replace(',', '.') for v in values])
+    decimals = pd.Series([f"{v / 100:.2f}".replace('.', ',') for v in values])
+    suppressed = dutch.where(rng.random(rows) > 0.05, '<5')
+    return {
+        "gehele getallen": pd.Series(values.astype(str), dtype="str"),
+        "duizendtallen (1.234)": dutch.astype("str"),
+        "decimalen (12,50)": decimals.astype("str"),
+        "met '<5'": suppressed.astype("str"),
+    }
+
+
+def best_of(func, series):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(series)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(rows):
+    print(f"{rows} rijen, beste van {REPEATS}")
+    for name, series in make_columns(rows).items():
+        old_time, old_result = best_of(old_chain, series)
+        new_time, new_result = best_of(lambda s: parse_numbers(s).numbers, series)
+        pd.testing.assert_series_equal(old_result, new_result, check_dtype=False, check_names=False)
+        print(f"  {name:24s} oud: {old_time * 1000:7.1f} ms  nieuw: {new_time * 1000:7.1f} ms  "
+              f"({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,73 @@
+"""
+Vergelijkt het uitlezen van links uit DUO-pagina's: de streaming tokenizer van
+duo_scraper.extract_anchors tegen de volledige BeautifulSoup-boom
+(extract_anchors_soup). Per pagina moeten de CSV-labels en de subpagina's gelijk zijn.
+
+Gebruik:
+    python benchmarks/bench_links.py [pad/naar/pagina.html ...]
+
+Opgeslagen pagina's (bijv. via 'Opslaan als' of curl) worden gelezen als UTF-8.
+Zonder argumenten worden synthetische pagina's in de opmaak van duo.nl gebruikt.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from duo_scraper import extract_anchors, extract_anchors_soup, find_csv_links, find_subpages  # noqa: E402
+
+BASE_URL = "https://duo.nl/open_onderwijsdata/middelbaar-beroepsonderwijs/aantal-studenten/"
+REPEATS = 20
+
+
+def synthetic_page(n_links=40, n_rows=400):
+    """Pagina met navigatie, een content area met tabellen en links, en een footer."""
+    nav = "".join(f'<li><a href="/particulier/pagina-{i}.jsp">Menu &amp; {i}</a></li>' for i in range(60))
+    links = "".join(
+        f'<li><a href="/open_onderwijsdata/mbo/subpagina-{i}.jsp"><span>Subpagina</span> {i}</a></li>'
+        for i in range(n_links)
+    )
+    csvs = "".join(
+        f'<tr><td>Bestand {i}</td><td><a href="/open_onderwijsdata/images/{i:02d}-studenten.csv">'
+        f'CSV <!-- download --> {i}</a></td><td>{i * 1234}</td></tr>'
+        for i in range(n_rows)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>DUO</title><script>var x = '<a href=\"no.csv\">';</script>"
+        f"<style>a {{ color: red; }}</style></head><body><header><nav><ul>{nav}</ul></nav></header>"
+        f"<main><h1>Aantal studenten</h1><p>Tekst met <b>opmaak</b> en een<br>regelafbreking.</p>"
+        f"<ul>{links}</ul><table>{csvs}</table><img src=x.png alt=''></main>"
+        f"<footer><a href=\"/open_onderwijsdata/footer.jsp\">Footer</a></footer></body></html>"
+    )
+
+
+def _timed(label, func):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func()
+    print(f"  {label:28s} {(time.perf_counter() - start) / REPEATS * 1000:.2f} ms")
+    return result
+
+
+def bench_page(name, html):
+    print(f"\n{name} ({len(html) / 1e3:.0f} kB)")
+    expected = _timed("BeautifulSoup (html.parser)", lambda: extract_anchors_soup(html))
+    anchors = _timed("streaming tokenizer", lambda: extract_anchors(html))
+    assert anchors == expected, "links wijken af"
+    assert find_csv_links(anchors, BASE_URL, "Pagina") == find_csv_links(expected, BASE_URL, "Pagina")
+    assert find_subpages(anchors, BASE_URL) == find_subpages(expected, BASE_URL)
+    print(f"  {len(anchors)} links, resultaten identiek")
+
+
+def main(paths):
+    if not paths:
+        bench_page("synthetisch (klein)", synthetic_page(n_links=10, n_rows=20))
+        bench_page("synthetisch (groot)", synthetic_page())
+        return
+    for path in paths:
+        bench_page(path, Path(path).read_text(encoding="utf-8", errors="replace"))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,27 @@
+"""Genereert synthetische DUO-achtige CSV-bestanden voor de benchmarks."""
+import random
+
+HEADER = "JAAR;INSTELLINGSNAAM;BRIN;GEMEENTENAAM;OPLEIDINGSNAAM;AANTAL;MAN;VROUW\n"
+
+
+def _dutch(value):
+    """Formatteert een geheel getal met een punt als duizendtalscheiding."""
+    return f"{value:,}".replace(',', '.')
+
+
+def write_duo_csv(path, rows=500_000, institutions=400, seed=42):
+    """Schrijft een puntkomma-gescheiden latin-1 bestand met Nederlandse getalnotatie en '<5'-waarden."""
+    rng = random.Random(seed)
+    names = [f"ROC Instelling {i} ({'Zuid' if i % 2 else 'Noord'}-Brabant é)" for i in range(institutions)]
+    with open(path, 'w', encoding='latin-1', newline='') as f:
+        f.write(HEADER)
+        for _ in range(rows):
+            i = rng.randrange(institutions)
+            total = rng.randrange(0, 5000)
+            men = rng.randrange(0, total + 1)
+            men_str = '<5' if men < 5 else _dutch(men)
+            f.write(
+                f"{rng.choice((2021, 2022, 2023, 2024))};{names[i]};{i:02d}XY;Gemeente {i % 60};"
+                f"Opleiding {rng.randrange(900)};{_dutch(total)};{men_str};{_dutch(total - men)}\n"
+            )
+    return path
@@ -0,0 +1,244 @@
+"""
+Inleesroutines voor DUO-CSV's met een keuze uit twee parsers.
+
+- 'pyarrow': de multi-threaded CSV-parser van Apache Arrow. Tekstkolommen blijven
+  Arrow-gebaseerd, dus er wordt geen Python-object per cel aangemaakt.
+- 'c': de standaard (single-threaded) pandas C-parser met dtype=str.
+
+Als pyarrow niet beschikbaar is of het inlezen mislukt, wordt automatisch
+teruggevallen op de C-parser. De parser is in te stellen met de omgevingsvariabele
+DUO_CSV_ENGINE.
+
+Daarnaast bevat deze module een snelle dialectdetectie (scheidingsteken,
+decimaalteken en codering) op basis van een klein stukje van het bestand.
+"""
+import hashlib
+import io
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers.readers import STR_NA_VALUES
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - pyarrow is optioneel
+    pa = None
+    pa_csv = None
+
+CSV_ENGINES = ("pyarrow", "c")
+DEFAULT_ENGINE = os.environ.get("DUO_CSV_ENGINE", "pyarrow")
+
+# Dezelfde waarden die pandas standaard als leeg (NaN) beschouwt
+_NULL_VALUES = sorted(STR_NA_VALUES)
+
+# Dialect van een CSV-bestand: scheidingsteken, decimaalteken en tekstcodering
+Dialect = namedtuple("Dialect", ["sep", "decimal", "encoding"])
+
+# Aantal bytes aan het begin van het bestand dat voor de dialectdetectie wordt bekeken
+SNIFF_BYTES = 64 * 1024
+# Kandidaat-scheidingstekens, in volgorde van voorkeur (DUO gebruikt meestal ';')
+_DELIMITERS = (';', ',', '\t', '|')
+_QUOTED = re.compile(r'"[^"]*"')
+
+
+def _arrow_string_dtype():
+    """
+    Pandas-dtype voor Arrow-tekstkolommen met NaN als ontbrekende waarde, zodat
+    vergelijkingen en pd.to_numeric zich gedragen als bij de C-parser.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        try:
+            return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 / 2.2
+        except (TypeError, ValueError):
+            return None
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _arrow_input(source):
+    """Geeft een invoer voor pyarrow terug zonder de bytes van een upload te kopiëren."""
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if hasattr(source, 'getbuffer'):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+    _rewind(source)
+    return pa.BufferReader(source.read())
+
+
+def _c_parser_header(source, sep, encoding):
+    """Kolomnamen zoals de pandas C-parser ze maakt; leest alleen de kopregel."""
+    _rewind(source)
+    names = pd.read_csv(source, sep=sep, encoding=encoding, dtype=str, nrows=0).columns.tolist()
+    _rewind(source)
+    return names
+
+
+def _arrow_options(source, sep, encoding, columns=None):
+    read_options = pa_csv.ReadOptions(encoding=encoding, use_threads=True)
+    parse_options = pa_csv.ParseOptions(delimiter=sep)
+
+    # Lees alleen het eerste blok om de kolomnamen te bepalen, zodat we elke kolom
+    # expliciet als tekst kunnen inlezen (net als dtype=str bij de C-parser).
+    with pa_csv.open_csv(_arrow_input(source), read_options=read_options, parse_options=parse_options) as reader:
+        column_names = reader.schema.names
+
+    # Dubbele of lege kolomnamen hernoemen zoals de C-parser dat doet (AANTAL.1, Unnamed: 3)
+    if '' in column_names or len(set(column_names)) < len(column_names):
+        column_names = _c_parser_header(source, sep, encoding)
+        read_options = pa_csv.ReadOptions(
+            encoding=encoding, use_threads=True, column_names=column_names, skip_rows=1
+        )
+
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in column_names},
+        null_values=_NULL_VALUES,
+        strings_can_be_null=True,
+        include_columns=list(columns) if columns is not None else None,
+    )
+    return dict(read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+
+
+def _arrow_to_pandas(table):
+    string_dtype = _arrow_string_dtype()
+    types_mapper = {pa.string(): string_dtype}.get if string_dtype is not None else None
+    return table.to_pandas(types_mapper=types_mapper)
+
+
+def _read_arrow(source, sep, encoding, columns=None):
+    table = pa_csv.read_csv(_arrow_input(source), **_arrow_options(source, sep, encoding, columns))
+    return _arrow_to_pandas(table)
+
+
+def read_csv_strings(source, sep=';', encoding='latin-1', engine=None, columns=None):
+    """
+    Leest een CSV in met alle kolommen als tekst, of alleen de gegeven kolommen.
+    Valt terug op de pandas C-parser als pyarrow ontbreekt of de Arrow-parser faalt.
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Onbekende CSV-parser '{engine}', kies uit {', '.join(CSV_ENGINES)}")
+
+    if engine == "pyarrow" and pa_csv is not None:
+        try:
+            return _read_arrow(source, sep, encoding, columns)
+        except (pa.ArrowException, UnicodeDecodeError, io.UnsupportedOperation):
+            pass
+
+    _rewind(source)
+    return pd.read_csv(source, sep=sep, encoding=encoding, dtype=str, usecols=columns)
+
+
+def open_csv_batches(source, sep=';', encoding='latin-1'):
+    """
+    Streamt de CSV als Arrow-recordbatches met alle kolommen als tekst, zodat het
+    bestand (bijv. naar Parquet) kan worden omgezet zonder het helemaal in te laden.
+    Vereist pyarrow.
+    """
+    return pa_csv.open_csv(_arrow_input(source), **_arrow_options(source, sep, encoding))
+
+
+def read_csv_head(source, nrows, sep=';', encoding='latin-1', engine=None):
+    """Leest alleen de eerste nrows rijen (alle kolommen, als tekst)."""
+    engine = engine or DEFAULT_ENGINE
+    if engine == "pyarrow" and pa_csv is not None:
+        try:
+            batches = []
+            with open_csv_batches(source, sep, encoding) as reader:
+                for batch in reader:
+                    batches.append(batch)
+                    if sum(len(b) for b in batches) >= nrows:
+                        break
+                table = pa.Table.from_batches(batches, schema=reader.schema)
+            return _arrow_to_pandas(table.slice(0, nrows))
+        except (pa.ArrowException, UnicodeDecodeError, io.UnsupportedOperation):
+            pass
+
+    _rewind(source)
+    return pd.read_csv(source, sep=sep, encoding=encoding, dtype=str, nrows=nrows)
+
+
+def read_prefix(source, n=SNIFF_BYTES):
+    """Leest de eerste n bytes van een pad of bestandsachtig object."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(n)
+    if hasattr(source, 'getbuffer'):
+        return bytes(source.getbuffer()[:n])
+    _rewind(source)
+    prefix = source.read(n)
+    _rewind(source)
+    return prefix
+
+
+def file_fingerprint(source):
+    """Goedkope, inhoudsgebaseerde vingerafdruk van een bestand (grootte + BLAKE2-hash)."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (str, os.PathLike)):
+        size = 0
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+                size += len(block)
+    else:
+        data = source.getbuffer() if hasattr(source, 'getbuffer') else source.read()
+        digest.update(data)
+        size = len(data)
+        _rewind(source)
+    return f"{size:x}-{digest.hexdigest()}"
+
+
+def _detect_delimiter(lines):
+    """Kiest het scheidingsteken dat in de kopregel staat en in elke regel even vaak voorkomt."""
+    unquoted = [_QUOTED.sub('', line) for line in lines]
+    header_counts = {d: unquoted[0].count(d) for d in _DELIMITERS}
+    for d in _DELIMITERS:
+        if header_counts[d] and all(line.count(d) == header_counts[d] for line in unquoted[1:]):
+            return d
+    # Geen consistent scheidingsteken: neem het teken dat het vaakst in de kopregel staat
+    best = max(_DELIMITERS, key=lambda d: header_counts[d])
+    return best if header_counts[best] else ';'
+
+
+def sniff_dialect(prefix):
+    """
+    Bepaalt scheidingsteken, decimaalteken en codering uit de eerste bytes van een CSV.
+
+    - Codering: een UTF-8 BOM of geldige UTF-8 met niet-ASCII tekens geeft UTF-8,
+      ongeldige UTF-8 geeft latin-1. Bij pure ASCII gelden de standaarden van DUO:
+      latin-1 voor puntkomma-bestanden, UTF-8 voor komma-bestanden.
+    - Decimaalteken: ',' tenzij de komma zelf het scheidingsteken is.
+    """
+    has_bom = prefix.startswith(b'\xef\xbb\xbf')
+    # Alleen volledige regels bekijken, zodat een afgekapt (multibyte) teken niet meetelt
+    if len(prefix) >= SNIFF_BYTES and b'\n' in prefix:
+        prefix = prefix[:prefix.rfind(b'\n')]
+
+    try:
+        text = prefix.decode('utf-8-sig')
+        utf8_ok = True
+    except UnicodeDecodeError:
+        text = prefix.decode('latin-1')
+        utf8_ok = False
+
+    lines = [line for line in text.splitlines() if line.strip()][:50] or ['']
+    sep = _detect_delimiter(lines)
+    decimal = '.' if sep == ',' else ','
+
+    if has_bom:
+        encoding = 'utf-8-sig'
+    elif not utf8_ok:
+        encoding = 'latin-1'
+    elif text.isascii():
+        encoding = 'utf-8' if sep == ',' else 'latin-1'
+    else:
+        encoding = 'utf-8'
+    return Dialect(sep, decimal, encoding)
@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+
+from aggregation import grouped_sum, top_n, with_other
+from csv_engine import file_fingerprint, read_csv_strings, read_prefix, sniff_dialect
+from dataset import DATASET_STORE_MAX_ENTRIES, HASH_FUNCS, DatasetHandle, downcast, downcast_report, encode_categorical
+from duo_scraper import CatalogRefresher
+from dutch_numbers import parse_numbers
+from page_cache import page_cache
+from parallel import map_columns
+from suppression import SuppressionMask
+from upload_cache import format_entries, upload_cache
 
 # -----------------------------------------------------------------------------
 # 1. CONFIGURATIE & STARTPUNT
@@ -17,135 +24,128 @@ START_URL = "https://duo.nl/open_onderwijsdata/middelbaar-beroepsonderwijs/aanta
 # 2. SCRAPER FUNCTIES
 # -----------------------------------------------------------------------------
 
-@st.cache_data(ttl=86400) # Cache voor 24 uur
-def scrape_duo_specific_structure(start_url):
-    """
-    Start op de 'Aantal studenten' pagina.
-    Zoekt CSV's op de pagina zelf, en zoekt links naar subpagina's
-    om daar ook CSV's te zoeken.
-    """
-    results = {"Selecteer een bestand...": None}
-    status_msg = st.empty()
-    
-    try:
-        # 1. Haal de startpagina op
-        status_msg.info(f"🌐 Startpagina ophalen: {start_url} ...")
-        response = requests.get(start_url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Focus op content area (om navigatie links te vermijden)
-        content = soup.find('main') or soup.find('div', id='content') or soup
-
-        # 2. Zoek CSV's direct op de startpagina
-        csvs_on_start = find_csv_links(content, start_url, "Startpagina")
-        results.update(csvs_on_start)
-        
-        # 3. Zoek subpagina's (links die NIET naar een bestand wijzen)
-        subpages = set()
-        for a in content.find_all('a', href=True):
-            href = a['href']
-            full_url = urljoin(start_url, href)
-            
-            # Filter regels: 
-            # - Moet op duo.nl blijven
-            # - Geen bestanden (.csv, .pdf, etc)
-            # - Geen mailto/tel
-            # - Vermijd links terug naar bovenliggende pagina's (vaak broodkruimels)
-            if "duo.nl" in full_url and not any(ext in href.lower() for ext in ['.csv', '.pdf', '.xls', '.zip', 'mailto:', 'javascript:', '#']):
-                # Extra check: we willen alleen dieper de structuur in, of gerelateerde pagina's
-                # We sluiten 'home' en algemene pagina's uit door te kijken of 'open_onderwijsdata' erin zit
-                if "open_onderwijsdata" in full_url:
-                    link_text = a.get_text(strip=True)
-                    if link_text:
-                        subpages.add((link_text, full_url))
-
-        # 4. Bezoek gevonden subpagina's
-        total = len(subpages)
-        for idx, (title, url) in enumerate(subpages):
-            # Vermijd duplicaten (de startpagina zelf)
-            if url == start_url: 
-                continue
-                
-            status_msg.info(f"🕵️ Scannen subpagina {idx+1}/{total}: {title}")
-            try:
-                sub_resp = requests.get(url, timeout=5)
-                sub_soup = BeautifulSoup(sub_resp.text, 'html.parser')
-                sub_content = sub_soup.find('main') or sub_soup.find('div', id='content') or sub_soup
-                
-                found_csvs = find_csv_links(sub_content, url, title)
-                results.update(found_csvs)
-            except Exception:
-                continue # Skip broken links
-
-        status_msg.empty()
-        
-        # Als we niks vinden, geef feedback
-        if len(results) == 1:
-            results["Geen CSV bestanden gevonden via automatische scan"] = None
-            
-        return results
+@st.cache_resource
+def catalog_refresher(start_url):
+    """Eén gedeelde CatalogRefresher per startpagina, voor alle sessies."""
+    return CatalogRefresher(start_url)
 
-    except Exception as e:
-        status_msg.error(f"Fout bij verbinden met DUO: {e}")
-        return {"Fout bij ophalen data": None}
-
-def find_csv_links(soup_element, base_url, category_prefix):
-    """Helper functie om CSV links uit een stuk HTML te vissen."""
-    found = {}
-    for a in soup_element.find_all('a', href=True):
-        href = a['href']
-        if href.lower().endswith('.csv'):
-            full_url = urljoin(base_url, href)
-            text = a.get_text(strip=True)
-            filename = href.split('/')[-1]
-            
-            # Label maken: "Pagina Titel - Link Tekst (Bestandsnaam)"
-            label = f"{category_prefix} | {text} ({filename})"
-            found[label] = full_url
-    return found
+@st.fragment(run_every=1)
+def catalog_refresh_status(refresher):
+    """Toont de voortgang van de achtergrondscan en herlaadt de pagina zodra die klaar is."""
+    if refresher.refreshing:
+        st.info(refresher.progress or "🌐 Catalogus verversen...")
+    else:
+        st.rerun()
 
 # -----------------------------------------------------------------------------
-# 3. DATA VERWERKING LOGICA (Ongewijzigd, want werkt goed)
+# 3. DATA VERWERKING LOGICA
 # -----------------------------------------------------------------------------
 
 @st.cache_data
-def load_raw_data(uploaded_file):
+def detect_dialect(fingerprint, _prefix):
+    """
+    Bepaalt scheidingsteken, decimaalteken en codering uit de eerste bytes van het bestand.
+    Gecached per vingerafdruk, zodat een herhaalde upload de detectie overslaat.
+    """
+    return sniff_dialect(_prefix)
+
+def load_raw_data(uploaded_file, fingerprint=None):
     try:
-        df = pd.read_csv(uploaded_file, sep=';', decimal=',', encoding='latin-1', dtype=str)
-        if df.shape[1] < 2:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, sep=',', decimal='.', dtype=str)
+        dialect = detect_dialect(fingerprint or file_fingerprint(uploaded_file), read_prefix(uploaded_file))
+        try:
+            df = read_csv_strings(uploaded_file, sep=dialect.sep, encoding=dialect.encoding)
+        except UnicodeDecodeError:
+            # Niet-UTF-8 tekens na het bekeken begin van het bestand: latin-1 leest altijd
+            df = read_csv_strings(uploaded_file, sep=dialect.sep, encoding='latin-1')
         return df
     except Exception as e:
         st.error(f"Kon bestand niet lezen: {e}")
         return None
 
-def detect_and_clean_data(df_raw):
-    df_clean = df_raw.copy()
-    mask_less_than_5 = pd.DataFrame(False, index=df_raw.index, columns=df_raw.columns)
+def clean_column(series, decimal=','):
+    """Zet één tekstkolom om: geeft de numerieke versie, de '<5'-mask en of de kolom numeriek lijkt."""
+    # Eén keer parsen, inclusief duizendtalscheiding en '<5' (zie dutch_numbers)
+    converted, is_privacy_val = parse_numbers(series, decimal)
+
+    valid_count = converted.notna().sum()
+    total_count = len(series)
+    is_numeric = valid_count > 0 and (is_privacy_val.any() or valid_count > 0.5 * total_count)
+    if is_numeric:
+        # Kleinste verliesvrije type; waar '<5' stond blijft NaN, de mask bewaart het apart
+        converted = downcast(converted)
+    return converted, is_privacy_val, is_numeric
+
+def detect_and_clean_data(df_raw, decimal=',', workers=None):
+    # Ondiepe kopie: alleen de omgezette kolommen krijgen nieuw geheugen (copy-on-write)
+    df_clean = df_raw.copy(deep=False)
+    # Compacte '<5'-mask: per kolom alleen de rijposities (zie suppression.py)
+    mask_less_than_5 = SuppressionMask(len(df_raw))
     numerics = []
     categoricals = []
 
-    for col in df_raw.columns:
-        series_clean = df_raw[col].str.strip()
-        is_privacy_val = series_clean == '<5'
-        mask_less_than_5[col] = is_privacy_val
-        
-        series_numeric_ready = series_clean.str.replace(',', '.', regex=False)
-        converted = pd.to_numeric(series_numeric_ready, errors='coerce')
-        
-        valid_count = converted.notna().sum()
-        total_count = len(df_raw)
-        
-        if valid_count > 0 and (is_privacy_val.any() or valid_count > 0.5 * total_count):
+    # Detectie en conversie per kolom lopen parallel (zie parallel.py);
+    # de resultaten worden daarna in kolomvolgorde verwerkt, net als serieel
+    results = map_columns(lambda col: clean_column(df_raw[col], decimal), df_raw.columns, workers)
+
+    for col, (converted, is_privacy_val, is_numeric) in zip(df_raw.columns, results):
+        mask_less_than_5.set_column(col, is_privacy_val)
+
+        if is_numeric:
             df_clean[col] = converted
             numerics.append(col)
         else:
             categoricals.append(col)
 
+    # Dimensies als categoricals (woordenboekcodering): minder geheugen, ook in de Parquet-cache
+    df_clean = encode_categorical(df_clean, categoricals)
     return df_clean, mask_less_than_5, categoricals, numerics
 
+@st.cache_data(hash_funcs=HASH_FUNCS)
+def get_fingerprint(uploaded_file):
+    """Inhoudshash van een upload, één keer per upload berekend."""
+    return file_fingerprint(uploaded_file)
+
+def load_cleaned_data(uploaded_file):
+    """Geeft de opgeschoonde dataset voor een upload (zie clean_dataset)."""
+    return clean_dataset(get_fingerprint(uploaded_file), uploaded_file)
+
+@st.cache_resource(max_entries=DATASET_STORE_MAX_ENTRIES)
+def clean_dataset(cache_key, _uploaded_file):
+    """
+    Pijplijnstap: inlezen en typedetectie, gememoiseerd op de vingerafdruk van de inhoud.
+    Het opgeschoonde resultaat (inclusief de '<5'-mask) wordt ook op schijf bewaard,
+    zodat een herhaalde upload het parsen en de detectie overslaat.
+    Via cache_resource delen alle sessies één alleen-lezen kopie (DatasetHandle).
+    """
+    cached = upload_cache.get(cache_key, "dashboard")
+    if cached is not None:
+        df_clean = cached.frames["clean"]
+        mask_less_than_5 = SuppressionMask.from_frame(cached.frames["mask_lt5"], len(df_clean), df_clean.columns)
+        return (DatasetHandle(df_clean, cache_key), mask_less_than_5,
+                cached.meta["categoricals"], cached.meta["numerics"])
+
+    df_raw = load_raw_data(_uploaded_file, cache_key)
+    if df_raw is None:
+        return None
+
+    dialect = detect_dialect(cache_key, read_prefix(_uploaded_file))
+    df_clean, mask_less_than_5, categoricals, numerics = detect_and_clean_data(df_raw, dialect.decimal)
+    upload_cache.put(
+        cache_key, "dashboard",
+        {"clean": df_clean, "mask_lt5": mask_less_than_5.to_frame()},
+        {"categoricals": categoricals, "numerics": numerics},
+    )
+    return DatasetHandle(df_clean, cache_key), mask_less_than_5, categoricals, numerics
+
+@st.cache_resource(hash_funcs=HASH_FUNCS, max_entries=64)
+def override_numeric_column(dataset, col, decimal=','):
+    """
+    Delta voor een handmatige override in 'Kolom Identificatie': zet alleen deze
+    kolom om naar numeriek, in plaats van de hele detectie opnieuw te draaien.
+    """
+    converted, _, _ = clean_column(dataset.frame[col], decimal)
+    return converted
+
 # -----------------------------------------------------------------------------
 # 4. DASHBOARD UI
 # -----------------------------------------------------------------------------
@@ -157,8 +157,18 @@ with st.container():
     st.markdown(f"### 1. Selecteer Dataset")
     st.markdown(f"*Bron: {START_URL}*")
     
-    # Run scraper
-    csv_options = scrape_duo_specific_structure(START_URL)
+    # Laatst bekende catalogus direct tonen; verversen gebeurt op de achtergrond
+    refresher = catalog_refresher(START_URL)
+    refresher.refresh()
+    csv_options = refresher.catalog
+    if refresher.refreshing:
+        catalog_refresh_status(refresher)
+    elif refresher.error is not None and csv_options is None:
+        st.error(f"Fout bij verbinden met DUO: {refresher.error}")
+    elif refresher.error is not None:
+        st.warning(f"Catalogus niet ververst ({refresher.error}); de laatst bekende versie wordt getoond.")
+    if csv_options is None:
+        csv_options = {"Fout bij ophalen data" if refresher.error is not None else "Selecteer een bestand...": None}
     
     col_sel, col_act = st.columns([2, 2])
     with col_sel:
@@ -178,10 +188,11 @@ st.markdown("### 2. Visualisatie")
 uploaded_file = st.file_uploader("Upload het CSV bestand", type=['csv'])
 
 if uploaded_file is not None:
-    df_raw = load_raw_data(uploaded_file)
+    loaded = load_cleaned_data(uploaded_file)
 
-    if df_raw is not None:
-        df_clean, mask_lt5, init_cats, init_nums = detect_and_clean_data(df_raw)
+    if loaded is not None:
+        dataset, mask_lt5, init_cats, init_nums = loaded
+        df_clean = dataset.frame
         all_cols = df_clean.columns.tolist()
 
         col_graph, col_settings = st.columns([3, 1])
@@ -195,6 +206,13 @@ if uploaded_file is not None:
                 selected_dims_cfg = st.multiselect("Dimensies (X-as)", all_cols, default=init_cats)
                 selected_meas_cfg = st.multiselect("Meetwaarden (Y-as)", all_cols, default=init_nums)
 
+            # Handmatig toegevoegde meetwaarden: alleen die kolommen (eenmalig) omzetten
+            extra_measures = [col for col in selected_meas_cfg if col not in init_nums]
+            if extra_measures:
+                decimal = detect_dialect(dataset.fingerprint, read_prefix(uploaded_file)).decimal
+                for col in extra_measures:
+                    df_clean[col] = override_numeric_column(dataset, col, decimal)
+
             st.divider()
             
             x_axis = st.selectbox("X-as (Dimensie)", selected_dims_cfg) if selected_dims_cfg else None
@@ -207,47 +225,57 @@ if uploaded_file is not None:
             top_n_optie = st.radio("Top N:", ["Top 5", "Top 10", "Top 20", "Alles"], index=1)
             sort_order = st.radio("Sortering:", ["Hoog naar Laag", "Laag naar Hoog"])
             ascending = True if sort_order == "Laag naar Hoog" else False
+            show_other = st.checkbox("Toon rest als 'Overig'", value=False, disabled=top_n_optie == "Alles")
+
+            with st.expander("💾 Upload-cache"):
+                st.caption(f"Eerder ingelezen bestanden in {upload_cache.directory}")
+                # De map alleen doorlopen als iemand de inhoud wil zien, niet bij elke rerun
+                if st.toggle("Toon inhoud", key="show_cache_entries"):
+                    st.dataframe(format_entries(), hide_index=True)
+                if st.button("Cache legen"):
+                    upload_cache.clear()
+                    page_cache.clear()
+                    st.rerun()
+
+            with st.expander("🔧 Debug: geheugen"):
+                numeric_cols = [col for col in df_clean.columns if pd.api.types.is_numeric_dtype(df_clean[col])]
+                report = downcast_report({col: df_clean[col] for col in numeric_cols})
+                saved = report["MB (64-bit)"].sum() - report["MB"].sum()
+                st.caption(f"Meetwaarden in kleinere types: {saved:.1f} MB bespaard "
+                           f"van {report['MB (64-bit)'].sum():.1f} MB")
+                st.dataframe(report, hide_index=True)
 
         # --- LINKERKANT: GRAFIEK ---
         with col_graph:
             if x_axis and y_axis:
-                # Data prep: <5 (NaN) wordt 0 voor de grafiek
-                df_viz = df_clean.copy()
-                df_viz[y_axis] = df_viz[y_axis].fillna(0)
+                # Aggregeren via de gecachete groepscodes van de X-as (zie aggregation.py).
+                # <5 (NaN) telt daarbij als 0 voor de grafiek.
+                df_grouped = grouped_sum(dataset, x_axis, {col: df_clean[col] for col in y_axis})
                 
-                # Aggregeren
-                df_grouped = df_viz.groupby(x_axis)[y_axis].sum().reset_index()
-                
-                # Sorteren
+                # Sorteren en Top N in één gedeeltelijke selectie (zie aggregation.top_n);
+                # bij "Alles" wordt gewoon alles gesorteerd
                 df_grouped['__Sort__'] = df_grouped[y_axis].sum(axis=1)
-                df_grouped = df_grouped.sort_values('__Sort__', ascending=ascending)
-                
-                # Top N
-                if "Top" in top_n_optie:
-                    n = int(top_n_optie.split()[1])
-                    df_final = df_grouped.head(n)
-                else:
-                    df_final = df_grouped
+                n = int(top_n_optie.split()[1]) if "Top" in top_n_optie else None
+                top_result = top_n(df_grouped, '__Sort__', n, ascending=ascending, label_col=x_axis)
+                df_final = top_result.top
+                df_plot = with_other(top_result, x_axis) if show_other else df_final
 
                 # Plot
                 st.subheader(f"Analyse: {', '.join(y_axis)} per {x_axis}")
                 fig = px.bar(
-                    df_final, x=x_axis, y=y_axis, 
+                    df_plot, x=x_axis, y=y_axis, 
                     template="plotly_white", barmode='stack',
                     title=f"{top_n_optie} Weergave"
                 )
-                fig.update_layout(legend_title="Legenda", xaxis={'categoryorder':'array', 'categoryarray': df_final[x_axis]})
+                fig.update_layout(legend_title="Legenda", xaxis={'categoryorder':'array', 'categoryarray': df_plot[x_axis]})
                 st.plotly_chart(fig, use_container_width=True)
 
                 # --- RAPPORTAGE <5 ---
                 st.markdown("---")
                 
-                # Filter mask op zichtbare categorieën
-                mask_sub = mask_lt5.loc[df_clean[x_axis].isin(df_final[x_axis])].copy()
-                mask_sub['__Dim__'] = df_clean.loc[mask_sub.index, x_axis]
-                
-                # Tel <5 per categorie voor de gekozen meetwaarden
-                lt5_counts = mask_sub.groupby('__Dim__')[y_axis].sum()
+                # Tel <5 per zichtbare categorie voor de gekozen meetwaarden,
+                # direct uit de compacte mask (alleen de '<5'-rijen worden bekeken)
+                lt5_counts = mask_lt5.count_by_group(df_clean[x_axis], y_axis, df_final[x_axis])
                 lt5_counts['Totaal_Verborgen'] = lt5_counts.sum(axis=1)
                 report = lt5_counts[lt5_counts['Totaal_Verborgen'] > 0].sort_values('Totaal_Verborgen', ascending=False)
 
@@ -0,0 +1,312 @@
+"""
+Dataset-handles voor de Streamlit-caches.
+
+st.cache_data hasht alle argumenten bij elke rerun. Voor een DataFrame of een
+upload betekent dat: de volledige inhoud hashen bij elke klik op een widget.
+Een DatasetHandle draagt een vingerafdruk die één keer bij het laden wordt
+berekend; met HASH_FUNCS gebruiken de gecachete hulpfuncties alleen die
+vingerafdruk als sleutel, zodat de kosten van een rerun niet meer groeien
+met het aantal rijen.
+
+De handles zelf worden met st.cache_resource gedeeld (de dataset-store): alle
+sessies lezen uit dezelfde, alleen-lezen basisdata. Met copy-on-write krijgt
+elke gebruiker via DatasetHandle.frame een goedkope weergave; filters en nieuwe
+kolommen worden daarop gebouwd zonder de basisdata te kopiëren.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+
+from csv_engine import file_fingerprint
+from dutch_numbers import to_numeric_nl
+
+# Copy-on-write: afgeleide DataFrames delen geheugen met de basisdata totdat er
+# geschreven wordt. Standaard vanaf pandas 3; in pandas 2 zetten we het aan.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Maximaal aantal datasets dat tegelijk in de gedeelde store blijft
+DATASET_STORE_MAX_ENTRIES = 8
+# Kolommen met meer unieke waarden dan dit deel van de rijen blijven tekst:
+# daar levert een woordenboek geen besparing op
+CATEGORICAL_MAX_RATIO = 0.5
+
+
+def encode_categorical(frame, cols, max_ratio=CATEGORICAL_MAX_RATIO):
+    """
+    Zet groeperingskolommen om naar categoricals (woordenboekcodering): elke unieke
+    waarde staat één keer in het geheugen, per rij alleen een kleine gehele code.
+    De categorieën zijn gesorteerd, zodat de codes direct als groepscodes bruikbaar zijn.
+    Geeft een nieuw (ondiep gekopieerd) DataFrame terug.
+    """
+    converted = {}
+    for col in cols:
+        series = frame[col]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_numeric_dtype(series):
+            continue
+        categorical = series.astype('category')
+        if len(categorical.cat.categories) <= max_ratio * len(series):
+            converted[col] = categorical
+    if not converted:
+        return frame
+    result = frame.copy(deep=False)
+    for col, categorical in converted.items():
+        result[col] = categorical
+    return result
+
+
+def downcast(values):
+    """
+    Meetwaarde in het kleinste verliesvrije type: gehele getallen naar int8/16/32 als
+    het bereik past, kommagetallen naar float32 als elke waarde (ook NaN) exact gelijk
+    blijft. De soort (geheel of komma) verandert niet, zodat sommen hetzelfde type houden.
+    """
+    kind = values.dtype.kind
+    if kind in 'iu' and values.dtype.itemsize > 1 and len(values):
+        low, high = values.min(), values.max()
+        for dtype in (np.int8, np.int16, np.int32):
+            if np.dtype(dtype).itemsize >= values.dtype.itemsize:
+                break
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    elif kind == 'f' and values.dtype.itemsize > 4:
+        with np.errstate(over='ignore'):
+            narrow = values.astype(np.float32)
+        if np.array_equal(narrow.to_numpy(dtype=np.float64), values.to_numpy(), equal_nan=True):
+            return narrow
+    return values
+
+
+def downcast_report(columns):
+    """
+    Geheugenoverzicht van omgezette meetwaarden (dict van naam naar Series), vergeleken
+    met de 64-bits kolommen die de parser oplevert. Voor het debugpaneel in de dashboards.
+    """
+    rows = [
+        {
+            "Kolom": name,
+            "Type": str(values.dtype),
+            "MB (64-bit)": round(len(values) * 8 / 1e6, 2),
+            "MB": round(values.nbytes / 1e6, 2),
+        }
+        for name, values in columns.items()
+    ]
+    return pd.DataFrame(rows, columns=["Kolom", "Type", "MB (64-bit)", "MB"])
+
+
+class DatasetHandle:
+    """
+    Een ingelezen DataFrame samen met de vingerafdruk van de bron.
+    De basisdata is alleen-lezen; gebruik .frame voor een eigen (lazy) weergave.
+    Afgeleide gegevens (zoals omgezette kolommen) worden per dataset één keer
+    berekend en bij de handle bewaard, zodat alle sessies ze delen.
+    """
+
+    __slots__ = ("_frame", "fingerprint", "_derived", "_lock")
+
+    def __init__(self, frame, fingerprint):
+        self._frame = frame
+        self.fingerprint = fingerprint
+        self._derived = {}
+        # RLock: een afgeleide mag zelf een andere afgeleide gebruiken (zie partitions)
+        self._lock = threading.RLock()
+
+    # Een LazyDatasetHandle leest kolommen pas in als ze nodig zijn
+    lazy = False
+
+    @property
+    def frame(self):
+        """Zero-copy weergave van de basisdata; schrijven daarin laat de basis ongemoeid."""
+        return self._frame.copy(deep=False)
+
+    @property
+    def sample(self):
+        """Rijen voor typedetectie en voorbeeldweergave; hier de volledige basisdata."""
+        return self.frame
+
+    @property
+    def columns(self):
+        return self._frame.columns.tolist()
+
+    def _column(self, col):
+        return self._frame[col]
+
+    def derived(self, key, compute):
+        """Geeft de afgeleide waarde voor key; compute() wordt per dataset maar één keer uitgevoerd."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = compute()
+            return self._derived[key]
+
+    def categorize(self, cols):
+        """
+        Zet de gegeven groeperingskolommen van de basisdata één keer om naar categoricals
+        (zie encode_categorical). Bestaande weergaven van .frame blijven ongewijzigd.
+        """
+        def convert():
+            self._frame = encode_categorical(self._frame, cols)
+            return True
+        self.derived(("categorical", tuple(cols)), convert)
+
+    def numeric_column(self, col, decimal=',', fill_value=None, keep=True):
+        """
+        Kolom omgezet naar getallen (Nederlandse notatie, zie dutch_numbers), in het
+        kleinste verliesvrije type (zie downcast).
+        Wordt bij het eerste gebruik omgezet en daarna hergebruikt; met keep=False
+        wordt een nieuwe omzetting niet bij de handle bewaard.
+        """
+        key = ("numeric", col, decimal, fill_value)
+
+        def convert():
+            numbers = to_numeric_nl(self._column(col), decimal)
+            return downcast(numbers if fill_value is None else numbers.fillna(fill_value))
+        if not keep:
+            with self._lock:
+                if key in self._derived:
+                    return self._derived[key]
+            return convert()
+        return self.derived(key, convert)
+
+    def numeric_columns(self):
+        """Alle tot nu toe omgezette meetwaarden, op kolomnaam (voor het debugpaneel)."""
+        with self._lock:
+            return {key[1]: values for key, values in self._derived.items() if key[0] == "numeric"}
+
+    def group_codes(self, col):
+        """
+        Kolom gefactoriseerd naar gehele groepscodes: (codes, uniques), met uniques
+        gesorteerd zoals groupby dat doet en code -1 voor lege waarden.
+        Eén keer per dataset berekend; daarna hoeft geen sleutel meer gehasht te worden.
+        Voor een categorical zijn dat direct de (gesorteerde) categoriecodes.
+        """
+        def build():
+            series = self._column(col)
+            if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+                return series.cat.codes.to_numpy().astype(np.intp), series.cat.categories
+            return pd.factorize(series, sort=True)
+        return self.derived(("codes", col), build)
+
+    def partitions(self, col):
+        """
+        Partitie-index van een kolom: per waarde de (oplopende) rijposities.
+        Gebouwd op de groepscodes; alle partities zijn views op één gesorteerde
+        positie-array. Lege waarden krijgen geen partitie.
+        """
+        def build():
+            codes, uniques = self.group_codes(col)
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            # Posities met code -1 (lege waarden) staan vooraan in order en worden overgeslagen
+            bounds = np.cumsum(counts) + np.count_nonzero(codes < 0)
+            starts = bounds - counts
+            return {value: order[start:end] for value, start, end in zip(uniques.tolist(), starts, bounds)}
+        return self.derived(("partitions", col), build)
+
+    def rows_for(self, col, values):
+        """Rijposities (in oorspronkelijke volgorde) waar col een van de gegeven waarden heeft."""
+        partitions = self.partitions(col)
+        parts = [partitions[value] for value in values if value in partitions]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def __len__(self):
+        return len(self._frame)
+
+    def __repr__(self):
+        return f"DatasetHandle({self.fingerprint!r}, {len(self._frame)} rijen x {self._frame.shape[1]} kolommen)"
+
+
+class LazyDatasetHandle(DatasetHandle):
+    """
+    DatasetHandle die volledige kolommen pas inleest wanneer een weergave ze gebruikt
+    (projection pushdown), voor brede bestanden.
+
+    sample (de eerste rijen, alle kolommen) dient voor typedetectie en voorbeeldweergave.
+    loader(kolommen) geeft een DataFrame met die volledige kolommen; eenmaal ingelezen
+    blijven ze bij de handle, zodat alle sessies ze delen. .frame bevat alleen de
+    ingelezen kolommen.
+    """
+
+    __slots__ = ("_sample", "_loader", "_all_columns", "_categorical_cols")
+
+    lazy = True
+
+    def __init__(self, sample, fingerprint, loader):
+        super().__init__(pd.DataFrame(), fingerprint)
+        self._sample = sample
+        self._loader = loader
+        self._all_columns = sample.columns.tolist()
+        self._categorical_cols = set()
+
+    @property
+    def sample(self):
+        return self._sample.copy(deep=False)
+
+    @property
+    def columns(self):
+        return list(self._all_columns)
+
+    @property
+    def loaded_columns(self):
+        return self._frame.columns.tolist()
+
+    def load(self, cols):
+        """Leest de gegeven kolommen in voor zover ze nog niet bij de handle staan."""
+        with self._lock:
+            missing = [col for col in dict.fromkeys(cols) if col not in self._frame.columns]
+            if not missing:
+                return
+            loaded = self._loader(missing)
+            loaded = encode_categorical(loaded, [col for col in missing if col in self._categorical_cols])
+            if self._frame.shape[1] == 0:
+                self._frame = loaded[missing]
+                return
+            frame = self._frame.copy(deep=False)
+            for col in missing:
+                frame[col] = loaded[col]
+            self._frame = frame
+
+    def _column(self, col):
+        self.load([col])
+        return self._frame[col]
+
+    def categorize(self, cols):
+        """Als DatasetHandle.categorize; kolommen die later worden ingelezen, worden dan direct omgezet."""
+        with self._lock:
+            new = [col for col in cols if col not in self._categorical_cols]
+            self._categorical_cols.update(new)
+            self._frame = encode_categorical(self._frame, [col for col in new if col in self._frame.columns])
+
+    def __len__(self):
+        if self._frame.shape[1] == 0:
+            self.load(self._all_columns[:1])
+        return len(self._frame)
+
+    def __repr__(self):
+        return (f"LazyDatasetHandle({self.fingerprint!r}, {len(self._frame.columns)} van "
+                f"{len(self._all_columns)} kolommen ingelezen)")
+
+
+def upload_key(uploaded_file):
+    """
+    Goedkope sleutel voor een upload. Streamlit geeft elke upload een uniek file_id;
+    alleen als dat ontbreekt wordt de inhoud gehasht.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return f"{file_id}-{uploaded_file.size}"
+    return file_fingerprint(uploaded_file)
+
+
+# Gebruik als @st.cache_data(hash_funcs=HASH_FUNCS)
+HASH_FUNCS = {
+    DatasetHandle: lambda dataset: dataset.fingerprint,
+    LazyDatasetHandle: lambda dataset: dataset.fingerprint,
+    UploadedFile: upload_key,
+}
@@ -0,0 +1,405 @@
+"""
+Scraper voor de open-onderwijsdata-pagina's van DUO.
+
+Vanaf een startpagina worden de CSV-links op die pagina verzameld, plus de links
+naar subpagina's binnen open_onderwijsdata; die subpagina's worden daarna ook op
+CSV-links doorzocht. De subpagina's worden gelijktijdig opgehaald op een begrensde
+threadpool (DUO_SCRAPER_PARALLEL, standaard 4 tegelijk, om duo.nl niet te
+overbelasten), zodat de totale tijd dicht bij die van de traagste pagina ligt.
+De resultaten worden in een vaste volgorde samengevoegd, dus de uitkomst hangt
+niet af van welke pagina het eerst binnen is.
+
+Alle verzoeken van één scan gaan via één requests.Session (make_session): de
+verbindingen blijven open (keep-alive) en worden hergebruikt, zodat TCP- en
+TLS-opbouw per scan één keer per verbinding wordt betaald in plaats van per
+pagina. De pool is per host begrensd; tijdelijke fouten worden met oplopende
+wachttijd opnieuw geprobeerd.
+
+De links worden met een streaming tokenizer (html.parser, zonder boom) uit de
+content area gehaald; zie extract_anchors.
+
+Pagina's worden voorwaardelijk opgevraagd met de validators uit de HTTP-cache op
+schijf (zie page_cache); een ongewijzigde pagina (304) wordt niet opnieuw geparsed.
+
+CatalogRefresher houdt de laatst bekende catalogus bij en ververst die in een
+achtergrondthread, zodat het dashboard nooit op een scan hoeft te wachten.
+
+Deze module kent geen Streamlit; voortgang wordt gemeld via een callback.
+"""
+import html
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from page_cache import page_cache
+
+# Maximaal aantal subpagina's dat tegelijk wordt opgehaald (beleefdheidslimiet)
+MAX_PARALLEL_REQUESTS = int(os.environ.get("DUO_SCRAPER_PARALLEL", "4"))
+START_TIMEOUT = 10
+SUBPAGE_TIMEOUT = 5
+# Open verbindingen per host in de sessiepool; meer gelijktijdige verzoeken wachten op een vrije
+POOL_SIZE = int(os.environ.get("DUO_SCRAPER_POOL_SIZE", str(MAX_PARALLEL_REQUESTS)))
+# Herhaalpogingen bij verbindingsfouten en tijdelijke serverfouten, met wachttijd
+# backoff * 2^(poging - 1) seconden
+RETRIES = int(os.environ.get("DUO_SCRAPER_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("DUO_SCRAPER_BACKOFF", "0.5"))
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+# Leeftijd (seconden) waarna de catalogus op de achtergrond wordt ververst, en de
+# wachttijd na een mislukte verversing
+CATALOG_MAX_AGE = int(os.environ.get("DUO_CATALOG_MAX_AGE", "86400"))
+CATALOG_RETRY_AFTER = 300
+
+# Links met deze stukjes zijn bestanden of geen pagina's
+_NON_PAGE_PATTERNS = ['.csv', '.pdf', '.xls', '.zip', 'mailto:', 'javascript:', '#']
+
+
+def make_session(pool_size=POOL_SIZE, retries=RETRIES, backoff=RETRY_BACKOFF):
+    """
+    requests.Session met keep-alive verbindingspool: per host maximaal pool_size
+    verbindingen (pool_block: verzoeken wachten op een vrije verbinding in plaats van
+    er een extra te openen) en herhaalpogingen voor GET bij tijdelijke fouten.
+    Na de laatste poging komt de foutstatus gewoon als response terug.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=_RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _report(progress, message):
+    if progress is not None:
+        progress(message)
+
+
+def content_area(soup):
+    """Focus op de content area (om navigatielinks te vermijden)."""
+    return soup.find('main') or soup.find('div', id='content') or soup
+
+
+def extract_anchors_soup(html):
+    """
+    Referentie voor extract_anchors via een volledige BeautifulSoup-boom: zelfde
+    uitkomst, maar langzamer (zie benchmarks/bench_links.py).
+    """
+    content = content_area(BeautifulSoup(html, 'html.parser'))
+    return [(a['href'], a.get_text(strip=True)) for a in content.find_all('a', href=True)]
+
+
+# Elementen zonder eindtag, en elementen waarvan de tekst niet meetelt voor get_text,
+# zoals BeautifulSoup met html.parser ze behandelt
+_VOID_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+_NON_TEXT_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+
+
+class _ContentAreaDone(Exception):
+    """De eerste <main> is gesloten; de rest van de pagina is niet meer nodig."""
+
+
+class _AnchorParser(HTMLParser):
+    """
+    Verzamelt <a href>-links met hun tekst uit een stroom tokens, zonder boom.
+    Elementen openen en sluiten zoals in de boom van BeautifulSoup (een eindtag
+    sluit het laatst geopende element met die naam en alles daarbinnen), zodat
+    de uitkomst gelijk is aan content_area + find_all + get_text(strip=True).
+    Omdat <main> voorgaat, worden links erbuiten niet meer bijgehouden zodra die
+    begint, en stopt het parsen wanneer hij sluit.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []            # namen van de open elementen
+        self.non_text = []         # posities in stack van open _NON_TEXT_ELEMENTS
+        self.closed_void = []      # void-elementen waarvan een losse eindtag genegeerd wordt
+        self.open_anchors = []     # (positie in stack, tekststukken) van open links
+        self.data = []             # tekst sinds de laatste tag
+        self.main_at = self.content_at = None
+        self.main_seen = self.content_seen = False
+        self.main, self.content, self.everything = [], [], []
+
+    def anchors(self, found):
+        return [(href, ''.join(pieces)) for href, pieces in found]
+
+    def result(self):
+        if self.main_seen:
+            return self.anchors(self.main)
+        return self.anchors(self.content if self.content_seen else self.everything)
+
+    def flush(self, include=None):
+        if not self.data:
+            return
+        text = ''.join(self.data).strip()
+        self.data = []
+        if text and self.open_anchors and (include or not self.non_text):
+            for _, pieces in self.open_anchors:
+                pieces.append(text)
+
+    def handle_starttag(self, tag, attrs, void=True):
+        self.flush()
+        position = len(self.stack)
+        self.stack.append(tag)
+        if tag in _NON_TEXT_ELEMENTS:
+            self.non_text.append(position)
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'main' and not self.main_seen:
+            self.main_seen, self.main_at = True, position
+        elif tag == 'div' and not self.content_seen and attrs.get('id') == 'content':
+            self.content_seen, self.content_at = True, position
+        if tag == 'a' and 'href' in attrs:
+            anchor = (attrs['href'], [])
+            self.open_anchors.append((position, anchor[1]))
+            if self.main_at is not None:
+                self.main.append(anchor)
+            elif not self.main_seen:
+                self.everything.append(anchor)
+                if self.content_at is not None:
+                    self.content.append(anchor)
+        if void and tag in _VOID_ELEMENTS:
+            self.handle_endtag(tag, check_closed=False)
+            self.closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void=False)
+        self.handle_endtag(tag, check_closed=False)
+
+    def handle_endtag(self, tag, check_closed=True):
+        if check_closed and tag in self.closed_void:
+            self.closed_void.remove(tag)
+            return
+        self.flush()
+        if tag not in self.stack:
+            return
+        position = len(self.stack) - 1 - self.stack[::-1].index(tag)
+        del self.stack[position:]
+        while self.non_text and self.non_text[-1] >= position:
+            self.non_text.pop()
+        while self.open_anchors and self.open_anchors[-1][0] >= position:
+            self.open_anchors.pop()
+        if self.content_at is not None and self.content_at >= position:
+            self.content_at = None
+        if self.main_at is not None and self.main_at >= position:
+            raise _ContentAreaDone()
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        self.data.append(html.unescape(f"&#{name};"))
+
+    def handle_entityref(self, name):
+        self.data.append(EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name, f"&{name}"))
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA["):])
+            self.flush(include=True)
+
+
+def extract_anchors(html):
+    """
+    Alle links in de content area van een pagina, als lijst van (href, linktekst).
+    De content area is de eerste <main>, anders de eerste <div id="content">, anders
+    de hele pagina (zie content_area).
+    """
+    parser = _AnchorParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _ContentAreaDone:
+        pass
+    parser.flush()
+    return parser.result()
+
+
+def find_csv_links(anchors, base_url, category_prefix):
+    """Helper functie om CSV links uit de links van een pagina (zie extract_anchors) te vissen."""
+    found = {}
+    for href, text in anchors:
+        if href.lower().endswith('.csv'):
+            full_url = urljoin(base_url, href)
+            filename = href.split('/')[-1]
+
+            # Label maken: "Pagina Titel - Link Tekst (Bestandsnaam)"
+            label = f"{category_prefix} | {text} ({filename})"
+            found[label] = full_url
+    return found
+
+
+def find_subpages(anchors, base_url):
+    """
+    Links naar subpagina's (links die NIET naar een bestand wijzen), als set van (titel, url).
+
+    Filter regels:
+    - Moet op duo.nl blijven
+    - Geen bestanden (.csv, .pdf, etc)
+    - Geen mailto/tel
+    - Alleen pagina's binnen 'open_onderwijsdata' (geen 'home' en algemene pagina's)
+    """
+    subpages = set()
+    for href, link_text in anchors:
+        full_url = urljoin(base_url, href)
+        if "duo.nl" in full_url and not any(ext in href.lower() for ext in _NON_PAGE_PATTERNS):
+            if "open_onderwijsdata" in full_url:
+                if link_text:
+                    subpages.add((link_text, full_url))
+    return subpages
+
+
+def fetch_anchors(session, url, timeout, cache=page_cache, raise_for_status=False):
+    """
+    Links van een pagina (zie extract_anchors). Met een cache wordt de pagina
+    voorwaardelijk opgevraagd; bij 304 Not Modified komen de links uit de cache en
+    wordt de pagina niet opnieuw geparsed.
+    """
+    entry = cache.get(url) if cache is not None else None
+    headers = cache.conditional_headers(entry) if cache is not None else {}
+    response = session.get(url, timeout=timeout, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        return entry.anchors
+    if raise_for_status:
+        response.raise_for_status()
+    anchors = extract_anchors(response.text)
+    if cache is not None and response.ok:
+        cache.put(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), anchors)
+    return anchors
+
+
+def scan_subpage(session, title, url, cache=page_cache):
+    """CSV-links op één subpagina."""
+    return find_csv_links(fetch_anchors(session, url, SUBPAGE_TIMEOUT, cache), url, title)
+
+
+def scrape_catalog(start_url, progress=None, max_workers=MAX_PARALLEL_REQUESTS, session=None, cache=page_cache):
+    """
+    Label -> CSV-URL voor de startpagina en alle subpagina's, met als eerste de
+    keuze "Selecteer een bestand..." (zonder URL). Fouten bij de startpagina worden
+    doorgegeven; een subpagina die niet te laden is wordt overgeslagen.
+    progress(bericht) wordt aangeroepen vanuit de aanroepende thread.
+    Zonder session wordt voor deze scan een eigen sessie (make_session) gebruikt;
+    cache=None schakelt de HTTP-cache op schijf (zie page_cache) uit.
+    """
+    if session is None:
+        with make_session() as own_session:
+            return scrape_catalog(start_url, progress, max_workers, own_session, cache)
+
+    results = {"Selecteer een bestand...": None}
+
+    # 1. Haal de startpagina op
+    _report(progress, f"🌐 Startpagina ophalen: {start_url} ...")
+    anchors = fetch_anchors(session, start_url, START_TIMEOUT, cache, raise_for_status=True)
+
+    # 2. Zoek CSV's direct op de startpagina
+    results.update(find_csv_links(anchors, start_url, "Startpagina"))
+
+    # 3. Zoek subpagina's, in vaste volgorde en zonder de startpagina zelf
+    subpages = sorted(page for page in find_subpages(anchors, start_url) if page[1] != start_url)
+
+    # 4. Bezoek de subpagina's gelijktijdig (begrensd); samenvoegen in de vaste volgorde
+    found = [None] * len(subpages)
+    if subpages:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(subpages)))) as pool:
+            futures = {pool.submit(scan_subpage, session, title, url, cache): idx for idx, (title, url) in enumerate(subpages)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                _report(progress, f"🕵️ Scannen subpagina {done}/{len(subpages)}: {subpages[idx][0]}")
+                try:
+                    found[idx] = future.result()
+                except Exception:
+                    continue  # Skip broken links
+    for csvs in found:
+        if csvs:
+            results.update(csvs)
+
+    # Als we niks vinden, geef feedback
+    if len(results) == 1:
+        results["Geen CSV bestanden gevonden via automatische scan"] = None
+    return results
+
+
+class CatalogRefresher:
+    """
+    De laatst bekende catalogus van een startpagina, met verversen op de achtergrond.
+
+    catalog is direct beschikbaar: de vorige scan (ook van voor een herstart, via
+    page_cache) of None als er nog nooit een scan gelukt is. refresh() start een
+    scan in een achtergrondthread als de catalogus ouder is dan max_age; zolang die
+    loopt, starten volgende aanroepen (ook vanuit andere sessies) geen tweede scan.
+    De thread raakt geen Streamlit aan: voortgang en fouten staan in progress en error.
+    """
+
+    def __init__(self, start_url, max_age=CATALOG_MAX_AGE, cache=page_cache):
+        self.start_url = start_url
+        self.max_age = max_age
+        self.cache = cache
+        self.progress = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._attempted_at = 0.0
+        stored = cache.get_catalog(start_url) if cache is not None else None
+        self.catalog, self.updated_at = stored if stored is not None else (None, 0.0)
+
+    @property
+    def refreshing(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    @property
+    def stale(self):
+        now = time.time()
+        return now - self.updated_at > self.max_age and now - self._attempted_at > CATALOG_RETRY_AFTER
+
+    def refresh(self, force=False):
+        """Start een scan op de achtergrond als dat nodig is; True als er een is gestart."""
+        with self._lock:
+            if self.refreshing or not (force or self.stale):
+                return False
+            self._attempted_at = time.time()
+            self.progress = None
+            self._thread = threading.Thread(target=self._run, name="duo-catalog-refresh", daemon=True)
+            self._thread.start()
+            return True
+
+    def _set_progress(self, message):
+        self.progress = message
+
+    def _run(self):
+        try:
+            catalog = scrape_catalog(self.start_url, progress=self._set_progress, cache=self.cache)
+        except Exception as e:
+            # De vorige catalogus blijft staan; na CATALOG_RETRY_AFTER wordt het opnieuw geprobeerd
+            self.error = e
+        else:
+            updated_at = time.time()
+            if self.cache is not None:
+                self.cache.put_catalog(self.start_url, catalog, updated_at)
+            self.catalog, self.updated_at, self.error = catalog, updated_at, None
+        finally:
+            self.progress = None
@@ -0,0 +1,116 @@
+"""
+Gedeelde parser voor getallen in Nederlandse notatie.
+
+DUO schrijft getallen als '1.234' (punt als duizendtalscheiding) en '12,5'
+(komma als decimaalteken), en vervangt kleine aantallen door '<5'. Deze module
+zet een tekstkolom in één keer om naar een numerieke kolom, met dezelfde
+uitkomst als de oude keten
+
+    series.str.replace('.', '').str.replace(',', '.') -> pd.to_numeric(errors='coerce')
+
+maar zonder tussenliggende pandas-Series van Python-strings: het werk gebeurt in
+Arrow-kernels op de tekstbuffers. Snelle paden:
+
+- de kolom is al numeriek: direct teruggeven;
+- scheidingstekens komen niet voor: het vervangen wordt overgeslagen;
+- alle waarden zijn geldig: één cast, zonder validatie per waarde. Een kolom met
+  alleen gehele getallen wordt zo direct int64.
+
+Zonder pyarrow wordt de klassieke pandas-keten gebruikt.
+"""
+from collections import namedtuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is optioneel
+    pa = None
+    pc = None
+
+# Waarden waarmee DUO kleine aantallen afschermt
+SUPPRESSION_MARKERS = ('<5',)
+
+# Een geldig getal nadat de duizendtalscheiding is verwijderd en het decimaalteken een punt is
+_NUMBER_PATTERN = r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'
+
+ParsedNumbers = namedtuple("ParsedNumbers", ["numbers", "suppressed"])
+
+
+def _thousands_for(decimal):
+    return '.' if decimal == ',' else ','
+
+
+def _to_arrow_strings(series):
+    """Arrow-tekstarray van een Series; zonder kopie als de kolom al Arrow-gebaseerd is."""
+    arr = pa.array(series, from_pandas=True)
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if not pa.types.is_string(arr.type):
+        arr = arr.cast(pa.string())
+    return arr
+
+
+def _contains(arr, pattern):
+    return pc.any(pc.match_substring(arr, pattern)).as_py() or False
+
+
+def _parse_arrow(series, decimal, markers):
+    arr = pc.utf8_trim_whitespace(_to_arrow_strings(series))
+    suppressed = pc.fill_null(pc.is_in(arr, value_set=pa.array(markers)), False)
+
+    # Alleen vervangen als het teken voorkomt; kolommen met gehele getallen slaan dit over
+    thousands = _thousands_for(decimal)
+    if _contains(arr, thousands):
+        arr = pc.replace_substring(arr, thousands, '')
+    if decimal != '.' and _contains(arr, decimal):
+        arr = pc.replace_substring(arr, decimal, '.')
+
+    # Snel pad: één cast als alle waarden geldig zijn. Zonder decimaalpunt naar int64,
+    # zodat het resultaat (net als bij pd.to_numeric) int64 is als er niets ontbreekt.
+    target = pa.float64() if _contains(arr, '.') else pa.int64()
+    try:
+        numbers = pc.cast(arr, target)
+    except pa.ArrowInvalid:
+        # Ongeldige waarden (zoals '<5') worden leeg, net als errors='coerce'
+        valid = pc.match_substring_regex(arr, _NUMBER_PATTERN)
+        numbers = pc.cast(pc.if_else(valid, arr, pa.scalar(None, pa.string())), pa.float64())
+
+    # int64 met lege waarden wordt float64 met NaN
+    return numbers.to_numpy(zero_copy_only=False), suppressed.to_numpy(zero_copy_only=False)
+
+
+def _parse_pandas(series, decimal, markers):
+    stripped = series.astype(str).str.strip()
+    cleaned = stripped.str.replace(_thousands_for(decimal), '', regex=False)
+    if decimal != '.':
+        cleaned = cleaned.str.replace(decimal, '.', regex=False)
+    numbers = pd.to_numeric(cleaned, errors='coerce').to_numpy()
+    return numbers, stripped.isin(markers).to_numpy()
+
+
+def parse_numbers(series, decimal=',', markers=SUPPRESSION_MARKERS):
+    """
+    Zet een tekstkolom in Nederlandse notatie om naar getallen.
+
+    Geeft ParsedNumbers terug: numbers (Series met dezelfde index en naam, int64 of
+    float64 met NaN voor ongeldige/lege waarden) en suppressed (booleaanse Series die
+    aangeeft waar een afschermingswaarde als '<5' stond).
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return ParsedNumbers(series, pd.Series(False, index=series.index, name=series.name))
+
+    if pa is not None:
+        numbers, suppressed = _parse_arrow(series, decimal, markers)
+    else:
+        numbers, suppressed = _parse_pandas(series, decimal, markers)
+    return ParsedNumbers(
+        pd.Series(numbers, index=series.index, name=series.name),
+        pd.Series(suppressed, index=series.index, name=series.name),
+    )
+
+
+def to_numeric_nl(series, decimal=','):
+    """Kortere vorm van parse_numbers voor als alleen de getallen nodig zijn."""
+    return parse_numbers(series, decimal).numbers
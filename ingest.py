@@ -0,0 +1,211 @@
+"""
+Streaming inleesroutines voor grote DUO-exports.
+
+In plaats van het hele bestand in één DataFrame te laden, wordt de CSV in
+blokken gelezen. Elk blok wordt direct opgeschoond en geaggregeerd, waarna de
+deelresultaten worden samengevoegd. Het piekgeheugen hangt zo af van de
+blokgrootte en het aantal groepen, niet van de bestandsgrootte.
+
+De upload wordt eerst naar schijf geschreven (spill_to_disk); daarna verwerken
+werkprocessen elk een eigen byte-bereik van het bestand en worden de deelsommen
+samengevoegd (aggregate_out_of_core). DUO-exports hebben geen regeleinden binnen
+velden, dus een blok kan veilig op een regeleinde beginnen en eindigen.
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from dutch_numbers import to_numeric_nl
+from parallel import imap_processes_unordered
+
+# Aantal rijen per blok; bepaalt (samen met het aantal groepen) het piekgeheugen
+DEFAULT_CHUNKSIZE = 100_000
+# Grootte van een blok per werkproces in de out-of-core modus
+DEFAULT_BLOCK_BYTES = 32 * 1024 * 1024
+# Map voor uploads die naar schijf worden geschreven
+SPILL_DIR = Path(os.environ.get("DUO_SPILL_DIR", Path(tempfile.gettempdir()) / "duo_spill"))
+# Maximaal aantal weggeschreven uploads per proces; de oudste worden verwijderd
+SPILL_MAX_FILES = 4
+
+# Weggeschreven uploads van dit proces (oudste eerst) en hoeveel lezers elk bestand nu heeft.
+# Alleen eigen bestanden die niemand leest, worden opgeruimd: de spill-map kan gedeeld
+# worden door meerdere processen, en binnen een proces door meerdere sessies.
+_spill_lock = threading.Lock()
+_spilled_here = {}
+_spill_readers = Counter()
+
+
+def iter_csv_chunks(source, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    """
+    Leest een DUO-CSV (puntkomma, latin-1) blok voor blok in als strings.
+    Werkt met een pad of een bestandsachtig object (zoals een Streamlit upload).
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(
+        source,
+        delimiter=';',
+        dtype=str,
+        encoding='latin-1',
+        usecols=usecols,
+        chunksize=chunksize,
+    )
+
+
+def _usecols(group_col, value_cols, year_col, selected_years):
+    filter_years = bool(year_col and selected_years)
+    return list(dict.fromkeys([group_col, *value_cols] + ([year_col] if filter_years else [])))
+
+
+def _partial_sums(chunk, group_col, value_cols, year_col, selected_years):
+    """Deelsom per groep voor één blok, of None als er na het jaarfilter niets overblijft."""
+    if year_col and selected_years:
+        chunk = chunk[chunk[year_col].isin(selected_years)]
+        if chunk.empty:
+            return None
+
+    numeric = pd.DataFrame(index=chunk.index)
+    for col in value_cols:
+        numeric[col] = to_numeric_nl(chunk[col]).fillna(0)
+    numeric[group_col] = chunk[group_col]
+    return numeric.groupby(group_col)[value_cols].sum()
+
+
+def _merge(totals, partial):
+    if partial is None:
+        return totals
+    return partial if totals is None else totals.add(partial, fill_value=0)
+
+
+def _finish(totals, group_col, value_cols):
+    if totals is None:
+        return pd.DataFrame(columns=[group_col, *value_cols])
+    # Deelsommen komen in willekeurige volgorde binnen; op groep sorteren zoals groupby
+    return totals.sort_index().reset_index()
+
+
+def spill_to_disk(source, name, directory=None):
+    """
+    Schrijft een upload (bestandsachtig object) naar schijf en geeft het pad terug.
+    Een eerder weggeschreven bestand met dezelfde naam wordt hergebruikt.
+    """
+    directory = Path(directory or SPILL_DIR)
+    path = directory / f"{name}.csv"
+    if path.exists():
+        # Markeer als recent gebruikt, zodat het niet als eerste wordt opgeruimd
+        with _spill_lock:
+            if path in _spilled_here:
+                _spilled_here[path] = _spilled_here.pop(path)
+        return path
+    directory.mkdir(parents=True, exist_ok=True)
+    # Via een tijdelijk bestand, zodat een gelijktijdige sessie nooit een half bestand leest
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            source.seek(0)
+            shutil.copyfileobj(source, out, 1024 * 1024)
+        os.replace(tmp_path, path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    with _spill_lock:
+        _spilled_here[path] = None
+        idle = [old for old in _spilled_here if old != path and not _spill_readers[old]]
+        for old in idle[:max(0, len(_spilled_here) - SPILL_MAX_FILES)]:
+            del _spilled_here[old]
+            old.unlink(missing_ok=True)
+    return path
+
+
+@contextmanager
+def spill_in_use(path):
+    """Zolang dit blok loopt, wordt het weggeschreven bestand op path niet opgeruimd."""
+    path = Path(path)
+    with _spill_lock:
+        _spill_readers[path] += 1
+    try:
+        yield path
+    finally:
+        with _spill_lock:
+            _spill_readers[path] -= 1
+            if not _spill_readers[path]:
+                del _spill_readers[path]
+
+
+def split_lines(path, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Kolomnamen en byte-bereiken (start, eind) van het bestand na de kopregel.
+    Elk bereik eindigt op een regeleinde, zodat het los te parsen is.
+    """
+    ranges = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + block_bytes, size))
+            f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    names = pd.read_csv(io.BytesIO(header), delimiter=';', dtype=str, encoding='latin-1', nrows=0).columns
+    return names.tolist(), ranges
+
+
+def _aggregate_range(path, start, end, names, group_col, value_cols, year_col, selected_years):
+    """Werkproces: leest één byte-bereik en geeft de deelsom per groep terug."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    chunk = pd.read_csv(
+        io.BytesIO(data),
+        delimiter=';',
+        header=None,
+        names=names,
+        usecols=_usecols(group_col, value_cols, year_col, selected_years),
+        dtype=str,
+        encoding='latin-1',
+    )
+    return _partial_sums(chunk, group_col, value_cols, year_col, selected_years)
+
+
+def aggregate_out_of_core(path, group_col, value_cols, year_col=None, selected_years=None,
+                          block_bytes=DEFAULT_BLOCK_BYTES, workers=None):
+    """
+    Berekent groupby(group_col)[value_cols].sum() over een bestand op schijf zonder
+    het volledig in te laden. Per blok wordt (optioneel) op jaar gefilterd, worden de
+    waardekolommen volgens de Nederlandse notatie omgezet en een deelsom berekend;
+    de blokken worden parallel in werkprocessen verwerkt en elke deelsom wordt direct
+    samengevoegd zodra die klaar is (zie parallel.imap_processes_unordered), zodat er
+    nooit meer dan één deelsom op het samenvoegen wacht.
+    """
+    value_cols = list(value_cols)
+    selected_years = list(selected_years or [])
+    totals = None
+    with spill_in_use(path):
+        names, ranges = split_lines(path, block_bytes)
+        partials = imap_processes_unordered(
+            _aggregate_range,
+            [(str(path), start, end, names, group_col, value_cols, year_col, selected_years) for start, end in ranges],
+            workers,
+        )
+        for partial in partials:
+            totals = _merge(totals, partial)
+    return _finish(totals, group_col, value_cols)
+
+
+def unique_values_in_chunks(source, col, chunksize=DEFAULT_CHUNKSIZE):
+    """Verzamelt de unieke (niet-lege) waarden van één kolom zonder het hele bestand te laden."""
+    seen = set()
+    with spill_in_use(source):
+        for chunk in iter_csv_chunks(source, chunksize=chunksize, usecols=[col]):
+            seen.update(chunk[col].dropna().unique())
+    return sorted(seen)
@@ -0,0 +1,115 @@
+"""
+Persistente HTTP-cache op schijf voor de gescande DUO-pagina's.
+
+Per URL worden de validators van de server (ETag en Last-Modified) bewaard, samen
+met wat de scraper uit de pagina haalt: de links (href en tekst) in de content
+area. Bij een volgende scan vraagt duo_scraper de pagina voorwaardelijk op
+(If-None-Match / If-Modified-Since); antwoordt de server met 304 Not Modified,
+dan worden de opgeslagen links gebruikt en hoeft de pagina niet opnieuw te worden
+gedownload of geparsed. Een dagelijkse verversing kost zo per ongewijzigde pagina
+alleen een klein verzoek.
+
+Daarnaast wordt per startpagina de laatst bekende catalogus bewaard, zodat het
+dashboard na een herstart direct iets kan tonen (zie duo_scraper.CatalogRefresher).
+
+De items staan in een submap van de upload-cache (DUO_PAGE_CACHE_DIR om dat te
+wijzigen); 'Cache legen' in dashboard.py en upload_cache.py --clear legen ook deze cache.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from upload_cache import CACHE_DIR
+
+PAGE_CACHE_DIR = Path(os.environ.get("DUO_PAGE_CACHE_DIR", CACHE_DIR / "pages"))
+# Verhogen wanneer het uitlezen van de links verandert, zodat oude items niet meer gebruikt worden
+PAGE_CACHE_VERSION = 1
+
+CachedPage = namedtuple("CachedPage", ["etag", "last_modified", "anchors"])
+
+
+class PageCache:
+    """Per URL de validators en de links van de laatst gedownloade versie."""
+
+    def __init__(self, directory=PAGE_CACHE_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, url, kind="page"):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"v{PAGE_CACHE_VERSION}-{kind}-{digest}.json"
+
+    def _write(self, path, data):
+        tmp_path = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Eerst naar een tijdelijk bestand en daarna hernoemen (atomair voor gelijktijdige scans)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(data, handle)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError, TypeError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def get(self, url):
+        """Geeft een CachedPage terug, of None als de URL niet (leesbaar) in de cache staat."""
+        try:
+            data = json.loads(self._path(url).read_text(encoding="utf-8"))
+            if data["url"] != url:
+                return None
+            anchors = [tuple(anchor) for anchor in data["anchors"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return CachedPage(data.get("etag"), data.get("last_modified"), anchors)
+
+    def conditional_headers(self, entry):
+        """Request-headers om een opgeslagen pagina te hervalideren."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, url, etag, last_modified, anchors):
+        """Slaat een pagina op; zonder validators valt er niets te hervalideren en wordt niets bewaard."""
+        if not etag and not last_modified:
+            return
+        data = {"url": url, "etag": etag, "last_modified": last_modified, "anchors": list(anchors)}
+        self._write(self._path(url), data)
+
+    def get_catalog(self, start_url):
+        """De laatst opgeslagen catalogus voor een startpagina als (catalogus, tijdstip), of None."""
+        try:
+            data = json.loads(self._path(start_url, "catalog").read_text(encoding="utf-8"))
+            if data["url"] != start_url:
+                return None
+            # Als lijst van paren opgeslagen, zodat de volgorde van de keuzes behouden blijft
+            return dict((label, url) for label, url in data["catalog"]), float(data["updated_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put_catalog(self, start_url, catalog, updated_at=None):
+        """Slaat de catalogus (label -> URL) van een startpagina op."""
+        data = {
+            "url": start_url,
+            "updated_at": time.time() if updated_at is None else updated_at,
+            "catalog": [[label, url] for label, url in catalog.items()],
+        }
+        self._write(self._path(start_url, "catalog"), data)
+
+    def clear(self):
+        """Verwijdert alle opgeslagen pagina's en catalogi."""
+        if not self.directory.exists():
+            return
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+# Gedeelde standaardcache voor duo_scraper
+page_cache = PageCache()
@@ -0,0 +1,53 @@
+"""
+Parallelle verwerking per kolom.
+
+Typedetectie en conversie gebeuren per kolom en zijn onafhankelijk van elkaar.
+Met een threadpool lopen ze over meerdere CPU-kernen: de Arrow-tekstoperaties
+en pd.to_numeric geven de GIL grotendeels vrij, en threads delen de data zonder
+die te kopiëren. De resultaten komen altijd in de volgorde van de invoer terug,
+dus de uitkomst is gelijk aan die van een gewone lus.
+
+Voor werk dat de GIL vasthoudt (zoals het parsen van losse CSV-blokken) zijn er
+imap_processes_unordered, met aparte werkprocessen.
+
+Het aantal workers is in te stellen met de omgevingsvariabele DUO_WORKERS
+(1 = serieel, standaard het aantal CPU-kernen).
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+DEFAULT_WORKERS = int(os.environ.get("DUO_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def map_columns(func, items, workers=None):
+    """Past func toe op elk item; parallel als er meer dan één worker is."""
+    items = list(items)
+    workers = min(workers or DEFAULT_WORKERS, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def imap_processes_unordered(func, arg_tuples, workers=None):
+    """
+    Roept func(*args) aan voor elk tupel in arg_tuples, verdeeld over werkprocessen, en
+    geeft de resultaten terug zodra ze klaar zijn (in willekeurige volgorde). Een
+    opgehaald resultaat wordt daarna niet meer vastgehouden, zodat de aanroeper niet
+    alle resultaten tegelijk in het geheugen heeft.
+    func moet op moduleniveau staan (picklebaar). 'spawn' in plaats van fork, omdat
+    Streamlit zelf threads draait.
+    """
+    arg_tuples = list(arg_tuples)
+    workers = min(workers or DEFAULT_WORKERS, len(arg_tuples))
+    if workers <= 1:
+        for args in arg_tuples:
+            yield func(*args)
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Geen eigen verwijzing naar de futures: as_completed laat een opgeleverde future
+        # los, zodat het resultaat vrijkomt zodra de aanroeper het heeft verwerkt
+        for future in as_completed([pool.submit(func, *args) for args in arg_tuples]):
+            yield future.result()
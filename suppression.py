@@ -0,0 +1,77 @@
+"""
+Compacte opslag van de '<5'-privacymask.
+
+DUO vervangt kleine aantallen door '<5'. Slechts een klein deel van de cellen is
+zo'n waarde, dus in plaats van een volledige booleaanse DataFrame bewaren we per
+kolom alleen waar ze staan: als gesorteerde rijposities (sparse), of als
+ingepakte bitset (1 bit per rij) wanneer dat kleiner is.
+"""
+import numpy as np
+import pandas as pd
+
+
+class SuppressionMask:
+    """Per kolom de rijposities van '<5'-cellen, als rij-indexarray of ingepakte bitset."""
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self._columns = {}
+        self._index_dtype = np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+
+    def set_column(self, col, is_suppressed):
+        """Slaat de mask van één kolom op in de kleinste vorm (posities of bitset)."""
+        values = np.asarray(is_suppressed, dtype=bool)
+        rows = np.flatnonzero(values).astype(self._index_dtype)
+        bits_size = (self.n_rows + 7) // 8
+        if rows.nbytes <= bits_size:
+            self._columns[col] = rows
+        else:
+            self._columns[col] = np.packbits(values)
+
+    def rows(self, col):
+        """Gesorteerde rijposities van de '<5'-cellen in een kolom."""
+        stored = self._columns.get(col)
+        if stored is None:
+            return np.empty(0, dtype=self._index_dtype)
+        if stored.dtype == np.uint8:
+            return np.flatnonzero(np.unpackbits(stored, count=self.n_rows))
+        return stored
+
+    def count_by_group(self, groups, cols, visible):
+        """
+        Telt per groep hoeveel '<5'-cellen er in de gegeven kolommen staan, alleen voor
+        groepen in visible. groups is de (volledige) groeperingskolom van de dataset.
+        Resultaat heeft dezelfde vorm als mask.groupby(groups)[cols].sum().
+        """
+        group_values = pd.Series(groups).reset_index(drop=True)
+        counts = {}
+        for col in cols:
+            labels = group_values.iloc[self.rows(col)]
+            if isinstance(labels.dtype, pd.CategoricalDtype):
+                # Alleen de voorkomende waarden tellen, geen lege categorieën
+                labels = labels.astype(labels.cat.categories.dtype)
+            counts[col] = labels[labels.isin(visible)].value_counts()
+        result = pd.DataFrame(counts, columns=list(cols)).fillna(0).astype('int64').sort_index()
+        result.index.name = '__Dim__'
+        return result
+
+    def to_frame(self):
+        """Lange vorm (kolom, rij) voor opslag in de Parquet-cache."""
+        cols = list(self._columns)
+        rows = [self.rows(col) for col in cols]
+        return pd.DataFrame({
+            "kolom": np.repeat(np.array(cols, dtype=object), [len(r) for r in rows]),
+            "rij": np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+        })
+
+    @classmethod
+    def from_frame(cls, frame, n_rows, columns):
+        """Herbouwt de mask uit de lange vorm van to_frame."""
+        mask = cls(n_rows)
+        rows_by_col = dict(tuple(frame.groupby("kolom")["rij"]))
+        for col in columns:
+            values = np.zeros(n_rows, dtype=bool)
+            if col in rows_by_col:
+                values[rows_by_col[col].to_numpy()] = True
+            mask.set_column(col, values)
+        return mask
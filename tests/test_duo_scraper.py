@@ -0,0 +1,150 @@
+"""
+Tests voor duo_scraper tegen een lokale HTTP-server met vaste DUO-achtige pagina's.
+
+De paden bevatten 'duo.nl' en 'open_onderwijsdata', zodat de filters van
+find_subpages dezelfde links volgen als op duo.nl zelf.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import duo_scraper
+from duo_scraper import extract_anchors, extract_anchors_soup, make_session, scrape_catalog
+from page_cache import PageCache
+
+ROOT = "/duo.nl/open_onderwijsdata/mbo"
+SUBPAGES = {
+    f"{ROOT}/studenten.jsp": ("Studenten", ["studenten-2022.csv", "studenten-2023.csv"]),
+    f"{ROOT}/diplomas.jsp": ("Diploma's", ["diplomas.csv"]),
+    f"{ROOT}/instroom.jsp": ("Instroom", ["instroom.csv"]),
+}
+# Geeft bij het eerste verzoek 503 en daarna de pagina
+FLAKY = f"{ROOT}/instroom.jsp"
+
+
+def _page(body):
+    nav = '<nav><a href="/duo.nl/open_onderwijsdata/home.jsp">Home</a><a href="/nav.csv">Nav</a></nav>'
+    return f"<html><body>{nav}<main>{body}</main><footer><a href='/f.csv'>F</a></footer></body></html>"
+
+
+def _start_page():
+    links = "".join(f'<li><a href="{path}">{title}</a></li>' for path, (title, _) in SUBPAGES.items())
+    return _page(
+        f'<p><a href="/files/overzicht.csv">Overzicht alle jaren</a></p><ul>{links}</ul>'
+        f'<a href="{ROOT}/start.jsp">Terug</a><a href="mailto:info@duo.nl">Mail</a><a href="{ROOT}/uitleg.pdf">PDF</a>'
+    )
+
+
+def _sub_page(files):
+    rows = "".join(f'<tr><td><a href="/files/{name}">Download &amp; {name}</a></td></tr>' for name in files)
+    return _page(f"<table>{rows}</table>")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stats = self.server.stats
+        with self.server.lock:
+            stats["requests"] += 1
+            stats["connections"].add(self.client_address)
+            first_flaky = self.path == FLAKY and self.path not in stats["seen"]
+            stats["seen"].add(self.path)
+        if self.path == f"{ROOT}/start.jsp":
+            body = _start_page()
+        elif self.path in SUBPAGES and not first_flaky:
+            body = _sub_page(SUBPAGES[self.path][1])
+        else:
+            self._send(503 if first_flaky else 404, b"")
+            return
+        etag = f'"{abs(hash(body))}"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.lock:
+                stats["not_modified"] += 1
+            self._send(304, b"", etag)
+        else:
+            self._send(200, body.encode(), etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.stats = {"requests": 0, "connections": set(), "seen": set(), "not_modified": 0}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _start_url(server):
+    return f"http://127.0.0.1:{server.server_port}{ROOT}/start.jsp"
+
+
+def _expected_catalog(server):
+    base = f"http://127.0.0.1:{server.server_port}"
+    expected = {
+        "Selecteer een bestand...": None,
+        "Startpagina | Overzicht alle jaren (overzicht.csv)": f"{base}/files/overzicht.csv",
+    }
+    # Subpagina's in vaste volgorde (op titel), ongeacht welke het eerst binnen is
+    for _, (title, files) in sorted(SUBPAGES.items(), key=lambda item: item[1][0]):
+        for name in files:
+            expected[f"{title} | Download & {name} ({name})"] = f"{base}/files/{name}"
+    return expected
+
+
+def _scrape(server, cache=None):
+    with make_session(backoff=0) as session:
+        return scrape_catalog(_start_url(server), session=session, cache=cache)
+
+
+def test_catalog_matches_canned_pages(server):
+    catalog = _scrape(server)
+    assert list(catalog.items()) == list(_expected_catalog(server).items())
+
+
+def test_session_reuses_connections(server):
+    _scrape(server)
+    stats = server.stats
+    # Start, drie subpagina's en één herhaling na 503
+    assert stats["requests"] == 5
+    assert len(stats["connections"]) < stats["requests"]
+
+
+def test_retries_after_503(server):
+    catalog = _scrape(server)
+    assert FLAKY in server.stats["seen"]
+    assert "Instroom | Download & instroom.csv (instroom.csv)" in catalog
+
+
+def test_unchanged_pages_are_not_parsed_again(server, tmp_path, monkeypatch):
+    cache = PageCache(tmp_path)
+    first = _scrape(server, cache)
+
+    def fail(html):
+        raise AssertionError("ongewijzigde pagina opnieuw geparsed")
+
+    monkeypatch.setattr(duo_scraper, "extract_anchors", fail)
+    assert _scrape(server, cache) == first
+    assert server.stats["not_modified"] == 1 + len(SUBPAGES)
+
+
+def test_anchor_tokenizer_matches_beautifulsoup():
+    for html in [_start_page(), *(_sub_page(files) for _, files in SUBPAGES.values())]:
+        assert extract_anchors(html) == extract_anchors_soup(html)
@@ -0,0 +1,208 @@
+"""
+Persistente cache op schijf voor ingelezen uploads.
+
+Elke upload wordt geïdentificeerd met een hash van de bestandsinhoud. Het
+opgeschoonde resultaat (een of meer DataFrames plus wat metadata) wordt als
+Parquet opgeslagen, zodat een nieuwe sessie die hetzelfde DUO-bestand upload
+het parsen en de typedetectie overslaat.
+
+De cache heeft een maximale grootte; bij overschrijding worden de minst recent
+gebruikte items verwijderd (LRU). Bekijken of legen kan via de dashboards of via:
+
+    python upload_cache.py --list
+    python upload_cache.py --clear
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:  # pragma: no cover - zonder pyarrow is de cache uitgeschakeld
+    pq = None
+    PARQUET_AVAILABLE = False
+
+CACHE_DIR = Path(os.environ.get("DUO_CACHE_DIR", Path.home() / ".cache" / "duo_dashboard"))
+CACHE_BUDGET_MB = int(os.environ.get("DUO_CACHE_BUDGET_MB", "1024"))
+# Verhogen wanneer het opschonen verandert, zodat oude cache-items niet meer gebruikt worden
+CACHE_VERSION = 5
+
+CacheEntry = namedtuple("CacheEntry", ["frames", "meta"])
+CacheInfo = namedtuple("CacheInfo", ["namespace", "key", "size_bytes", "last_used", "path"])
+
+_META_FILE = "meta.json"
+
+
+class UploadCache:
+    """Inhoudsgeadresseerde Parquet-cache met een groottebudget en LRU-verwijdering."""
+
+    def __init__(self, directory=CACHE_DIR, budget_bytes=CACHE_BUDGET_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.budget_bytes = budget_bytes
+
+    @property
+    def enabled(self):
+        return PARQUET_AVAILABLE and self.budget_bytes > 0
+
+    def _entry_dir(self, namespace, key):
+        return self.directory / f"{namespace}-v{CACHE_VERSION}-{key}"
+
+    def get(self, key, namespace):
+        """Geeft een CacheEntry terug, of None als het item niet (leesbaar) in de cache staat."""
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(namespace, key)
+        meta_path = entry_dir / _META_FILE
+        try:
+            meta = json.loads(meta_path.read_text())
+            frames = {name: pd.read_parquet(entry_dir / f"{name}.parquet") for name in meta["frames"]}
+            # Markeer als recent gebruikt voor de LRU-volgorde
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return CacheEntry(frames, meta["meta"])
+
+    def frame_path(self, key, namespace, name):
+        """Pad van één opgeslagen Parquet-bestand (voor directe queries), of None."""
+        if not self.enabled:
+            return None
+        path = self._entry_dir(namespace, key) / f"{name}.parquet"
+        return path if path.exists() else None
+
+    def read_columns(self, key, namespace, name, columns):
+        """Alleen de gegeven kolommen van één opgeslagen DataFrame, of None als het er niet (meer) is."""
+        path = self.frame_path(key, namespace, name)
+        if path is None:
+            return None
+        try:
+            frame = pd.read_parquet(path, columns=list(columns))
+            os.utime(path.parent / _META_FILE)
+        except (OSError, ValueError, KeyError):
+            return None
+        return frame
+
+    def read_head(self, key, namespace, name, nrows):
+        """De eerste nrows rijen (alle kolommen) van één opgeslagen DataFrame, of None."""
+        path = self.frame_path(key, namespace, name)
+        if path is None:
+            return None
+        try:
+            parquet_file = pq.ParquetFile(path)
+            batch = next(parquet_file.iter_batches(batch_size=nrows), None)
+            os.utime(path.parent / _META_FILE)
+            if batch is None:
+                return parquet_file.schema_arrow.empty_table().to_pandas()
+            return batch.to_pandas()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, namespace, frames, meta=None):
+        """Slaat DataFrames en metadata op; een mislukte schrijfactie laat de app gewoon doorgaan."""
+        def write(tmp_dir):
+            for name, frame in frames.items():
+                frame.to_parquet(tmp_dir / f"{name}.parquet", index=False)
+        self._write_entry(key, namespace, list(frames), write, meta)
+
+    def put_batches(self, key, namespace, name, open_batches, meta=None):
+        """
+        Slaat één tabel op uit een stroom Arrow-recordbatches (open_batches() geeft de
+        reader, bijv. csv_engine.open_csv_batches), blok voor blok, zonder de hele
+        tabel in het geheugen te laden.
+        """
+        def write(tmp_dir):
+            with open_batches() as reader:
+                with pq.ParquetWriter(tmp_dir / f"{name}.parquet", reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+        self._write_entry(key, namespace, [name], write, meta)
+
+    def _write_entry(self, key, namespace, names, write, meta):
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(namespace, key)
+        tmp_dir = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Eerst naar een tijdelijke map schrijven en daarna hernoemen, zodat een
+            # gelijktijdige sessie nooit een half geschreven item leest.
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+            write(tmp_dir)
+            (tmp_dir / _META_FILE).write_text(json.dumps({"frames": names, "meta": meta or {}}))
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except (OSError, ValueError, TypeError):
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """Lijst van CacheInfo voor alle items, meest recent gebruikt eerst."""
+        if not self.directory.exists():
+            return []
+        infos = []
+        for entry_dir in self.directory.iterdir():
+            meta_path = entry_dir / _META_FILE
+            if entry_dir.name.startswith(".") or not meta_path.exists():
+                continue
+            # Items van een oudere CACHE_VERSION tellen mee voor het budget en worden als eerste opgeruimd
+            namespace, _, key = entry_dir.name.partition(f"-v{CACHE_VERSION}-")
+            last_used = meta_path.stat().st_mtime if key else 0.0
+            size = sum(f.stat().st_size for f in entry_dir.iterdir())
+            infos.append(CacheInfo(namespace, key or entry_dir.name, size, last_used, entry_dir))
+        return sorted(infos, key=lambda info: info.last_used, reverse=True)
+
+    def total_bytes(self):
+        return sum(info.size_bytes for info in self.entries())
+
+    def evict(self):
+        """Verwijdert de minst recent gebruikte items totdat de cache binnen het budget past."""
+        total = 0
+        for info in self.entries():
+            total += info.size_bytes
+            if total > self.budget_bytes:
+                shutil.rmtree(info.path, ignore_errors=True)
+
+    def clear(self):
+        """Verwijdert de volledige cache."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Gedeelde standaardcache voor app.py en dashboard.py
+upload_cache = UploadCache()
+
+
+def format_entries(cache=upload_cache):
+    """Overzicht van de cache als DataFrame, voor weergave in de dashboards."""
+    rows = [
+        {
+            "Type": info.namespace,
+            "Sleutel": info.key[:16],
+            "Grootte (MB)": round(info.size_bytes / 1e6, 2),
+            "Laatst gebruikt": time.strftime("%Y-%m-%d %H:%M", time.localtime(info.last_used)),
+        }
+        for info in cache.entries()
+    ]
+    return pd.DataFrame(rows, columns=["Type", "Sleutel", "Grootte (MB)", "Laatst gebruikt"])
+
+
+if __name__ == "__main__":
+    if "--clear" in sys.argv:
+        # Hier pas importeren: page_cache gebruikt CACHE_DIR uit deze module
+        from page_cache import page_cache
+        upload_cache.clear()
+        page_cache.clear()
+        print(f"Cache geleegd: {upload_cache.directory} en {page_cache.directory}")
+    else:
+        print(f"Cache: {upload_cache.directory} "
+              f"({upload_cache.total_bytes() / 1e6:.1f} MB van {CACHE_BUDGET_MB} MB)")
+        print(format_entries().to_string(index=False))